@@ -0,0 +1,204 @@
+from __future__ import absolute_import, annotations
+
+import itertools
+import os
+import sys
+import threading
+import time
+from typing import List, Dict, Tuple, Iterable, Iterator, Callable, Any, Optional, Sequence
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.svm import SVC
+
+try:  # optional, it reads the resident memory on every platform
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def _resident_memory() -> float:
+    # resident set size of the process in MiB (the whole memory used, also the one allocated by the native code of scikit-learn)
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2 ** 20
+    if os.path.isfile("/proc/self/statm"):
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    try:
+        import resource
+    except ImportError:  # Windows without psutil, the memory is not measured
+        return 0.0
+
+    # without psutil on macOS only the peak resident memory of the process is available (in bytes, in kilobytes on the other Unix systems)
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def measure(function: Callable, *args, sampling_interval: float = 0.01, **kwargs) -> Tuple[Any, float, float]:
+    """
+    run a function measuring its wall-clock time and its peak of memory, sampling the resident memory from another thread
+    :param function: function to run
+    :param sampling_interval: seconds between two samples of the resident memory
+    :return: result of the function, seconds taken and peak of memory in MiB over the memory used before the call
+    """
+    initial_memory: float = _resident_memory()
+    peak_memory: List[float] = [initial_memory]
+    done: threading.Event = threading.Event()
+
+    def sample() -> None:
+        while not done.wait(sampling_interval):
+            peak_memory[0] = max(peak_memory[0], _resident_memory())
+
+    sampler: threading.Thread = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    start: float = time.perf_counter()
+    try:
+        result: Any = function(*args, **kwargs)
+        elapsed: float = time.perf_counter() - start
+    finally:
+        done.set()
+        sampler.join()
+
+    return result, elapsed, max(peak_memory[0], _resident_memory()) - initial_memory
+
+
+# number of chunks kept in the shuffle buffer of the texts that can only be read in order
+SHUFFLE_BUFFER_CHUNKS: int = 10
+
+
+def _is_indexable(values: Optional[Iterable]) -> bool:
+    # lists, arrays and `ReviewStore`s can be read by index, so they can be shuffled globally without loading them all
+    return values is None or isinstance(values, (Sequence, np.ndarray)) or (hasattr(values, "__len__") and hasattr(values, "__getitem__"))
+
+
+def _indexed_chunks(texts: Sequence[str], labels: Optional[Sequence[int]], chunk_size: int, order: np.ndarray) -> Iterator[Tuple[List[str], Optional[np.ndarray]]]:
+    labels_array: Optional[np.ndarray] = np.asarray(labels) if labels is not None else None
+    for chunk_start in range(0, len(order), chunk_size):
+        chunk_indices: np.ndarray = order[chunk_start:chunk_start + chunk_size]
+        yield [texts[index] for index in chunk_indices.tolist()], labels_array[chunk_indices] if labels_array is not None else None
+
+
+def _buffered_chunks(pairs: Iterator[Tuple[str, Optional[int]]], chunk_size: int, random_state: np.random.RandomState) -> Iterator[Tuple[List[str], Optional[np.ndarray]]]:
+    # each text read replaces a random one of the buffer, that is emitted, so the texts of a chunk come from several chunks of the stream
+    buffer: List[Tuple[str, Optional[int]]] = list(itertools.islice(pairs, SHUFFLE_BUFFER_CHUNKS * chunk_size))
+    chunk: List[Tuple[str, Optional[int]]] = []
+    for pair in pairs:
+        position: int = random_state.randint(len(buffer))
+        chunk.append(buffer[position])
+        buffer[position] = pair
+        if len(chunk) == chunk_size:
+            yield _unzip_chunk(chunk)
+            chunk = []
+
+    remaining: List[Tuple[str, Optional[int]]] = chunk + [buffer[index] for index in random_state.permutation(len(buffer)).tolist()]
+    for chunk_start in range(0, len(remaining), chunk_size):
+        yield _unzip_chunk(remaining[chunk_start:chunk_start + chunk_size])
+
+
+def _unzip_chunk(chunk: List[Tuple[str, Optional[int]]]) -> Tuple[List[str], Optional[np.ndarray]]:
+    return [text for text, _ in chunk], np.fromiter((label for _, label in chunk), dtype=np.int64, count=len(chunk)) if chunk[0][1] is not None else None
+
+
+def _ordered_pairs(texts: Iterable[str], labels: Optional[Iterable[int]]) -> Iterator[Tuple[str, Optional[int]]]:
+    if labels is None:
+        yield from ((text, None) for text in texts)
+        return
+
+    sentinel: object = object()
+    for text, label in itertools.zip_longest(texts, labels, fillvalue=sentinel):
+        if text is sentinel or label is sentinel:
+            raise ValueError("Size Mismatch: the texts and the labels have different lengths")
+        yield text, label
+
+
+def iterate_chunks(texts: Iterable[str], labels: Optional[Iterable[int]], chunk_size: int, random_state: Optional[np.random.RandomState] = None) -> Iterator[Tuple[List[str], Optional[np.ndarray]]]:
+    """
+    read the texts in chunks, so that only the texts of one chunk (or of the shuffle buffer) are decoded and vectorized at a time
+    :param texts: texts to read
+    :param labels: labels of the texts, in the same order, or None
+    :param chunk_size: number of texts of each chunk
+    :param random_state: if given, the texts are shuffled: globally if they can be read by index (a list, an array or a `ReviewStore`), otherwise through a buffer of `SHUFFLE_BUFFER_CHUNKS` chunks
+    :return: the (texts, labels) chunks, with None labels if they are not given
+    """
+    if random_state is not None and _is_indexable(texts) and _is_indexable(labels):
+        # a corpus sorted by label (e.g. all the negative reviews and then the positive ones) would otherwise give chunks of a single class
+        if labels is not None and len(texts) != len(labels):
+            raise ValueError(f"Size Mismatch: texts: {len(texts)} & labels: {len(labels)}")
+        yield from _indexed_chunks(texts, labels, chunk_size, random_state.permutation(len(texts)))
+    elif random_state is not None:
+        yield from _buffered_chunks(_ordered_pairs(texts, labels), chunk_size, random_state)
+    else:
+        pairs: Iterator[Tuple[str, Optional[int]]] = _ordered_pairs(texts, labels)
+        while True:
+            chunk: List[Tuple[str, Optional[int]]] = list(itertools.islice(pairs, chunk_size))
+            if not chunk:
+                return
+            yield _unzip_chunk(chunk)
+
+
+def fit_count_svc(texts: List[str], labels: List[int]) -> Tuple[CountVectorizer, SVC]:
+    # the vocabulary is built on the training texts only, the test texts are just transformed with it
+    vectorizer: CountVectorizer = CountVectorizer()
+    classifier: SVC = SVC()
+    classifier.fit(vectorizer.fit_transform(texts), labels)
+    return vectorizer, classifier
+
+
+def fit_summary(measurements: Dict[str, Tuple[float, float]]) -> str:
+    """
+    format the fit measurements of the baselines as a table
+    :param measurements: seconds taken and peak of memory in MiB of each baseline
+    :return: the table
+    """
+    rows: List[str] = [f"{'baseline':<32}{'fit time (s)':>14}{'peak memory (MiB)':>20}"]
+    for name, (seconds, memory) in measurements.items():
+        rows.append(f"{name:<32}{seconds:>14.1f}{memory:>20.1f}")
+    return "\n".join(rows)
+
+
+class StreamingBaseline:
+    """
+    Bag-of-words baseline with hashed n-gram features and a linear classifier trained out-of-core with `partial_fit` over chunks
+    """
+
+    def __init__(self, n_features: int = 2 ** 20, ngram_range: Tuple[int, int] = (1, 2), chunk_size: int = 5000, epochs: int = 5, alpha: float = 1e-5, random_state: int = 42) -> None:
+        # the hashing vectorizer is stateless, so nothing is fitted on the test set and no vocabulary is kept in memory
+        self.vectorizer = HashingVectorizer(n_features=n_features, ngram_range=ngram_range, alternate_sign=False, norm="l2")
+        self.classifier = SGDClassifier(loss="hinge", alpha=alpha, random_state=random_state)
+        self.chunk_size = chunk_size
+        self.epochs = epochs
+        self.random_state = np.random.RandomState(random_state)
+
+    def fit(self, texts: Iterable[str], labels: Iterable[int], classes: Optional[Sequence[int]] = None) -> StreamingBaseline:
+        """
+        train the classifier on the training split only, with several passes over chunks of `chunk_size` texts, in a new random order of the whole split at each epoch
+        :param texts: training texts, read again at each epoch: a list or a `ReviewStore` is shuffled globally reading its texts by index, any other iterable that can be iterated more times (e.g. over a file) only through a buffer of `SHUFFLE_BUFFER_CHUNKS` chunks
+        :param labels: training labels, in the same order
+        :param classes: all the labels, needed only if they cannot be collected from `labels` before the training (i.e. if it is not a sequence)
+        :return: the fitted baseline
+        """
+        if self.epochs > 1 and (iter(texts) is texts or iter(labels) is labels):
+            raise ValueError("Unexpected iterator: the texts and the labels are read once for each epoch, use `fit_chunks` with a function that creates the chunks")
+        if classes is None and not isinstance(labels, (Sequence, np.ndarray)):
+            raise ValueError("Unexpected labels: `classes` must be given when the labels are not a sequence")
+
+        return self.fit_chunks(lambda: iterate_chunks(texts, labels, self.chunk_size, self.random_state), classes if classes is not None else np.unique(np.asarray(labels)))
+
+    def fit_chunks(self, make_chunks: Callable[[], Iterable[Tuple[List[str], Sequence[int]]]], classes: Sequence[int]) -> StreamingBaseline:
+        """
+        train the classifier out-of-core on chunks produced by a function (e.g. a generator reading them from disk), so that only one chunk is in memory at a time
+        :param make_chunks: function called once for each epoch, returning the (texts, labels) chunks
+        :param classes: all the labels
+        :return: the fitted baseline
+        """
+        classes = np.asarray(classes)
+        for _ in range(self.epochs):
+            for chunk_texts, chunk_labels in make_chunks():
+                self.classifier.partial_fit(self.vectorizer.transform(chunk_texts), np.asarray(chunk_labels), classes=classes)
+
+        return self
+
+    def predict(self, texts: Iterable[str]) -> np.ndarray:
+        predictions: List[np.ndarray] = [self.classifier.predict(self.vectorizer.transform(chunk_texts)) for chunk_texts, _ in iterate_chunks(texts, None, self.chunk_size)]
+        return np.concatenate(predictions) if predictions else np.zeros(0, dtype=np.int64)
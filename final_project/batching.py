@@ -0,0 +1,103 @@
+from __future__ import absolute_import, annotations
+
+from typing import List, Tuple, Iterator, Optional
+
+import numpy as np
+import torch
+from torch.nn.utils.rnn import pad_sequence
+from torch.utils.data import Dataset, Sampler
+
+from preprocessing import PADDING_INDEX
+
+
+MIN_PADDED_LENGTH: int = 8  # the widest convolution of the CNNs needs at least 8 positions
+
+
+class SequenceDataset(Dataset):
+    """
+    Dataset of variable-length index sequences stored as a ragged array (concatenated indices plus offsets)
+    """
+
+    def __init__(self, indices: np.ndarray, offsets: np.ndarray, labels: List[int], max_length: Optional[int] = None) -> None:
+        super().__init__()
+        if len(offsets) != len(labels) + 1:
+            raise ValueError(f"Size Mismatch: offsets: {len(offsets)} & labels: {len(labels)}")
+
+        self.indices = indices
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.labels = labels
+        self.max_length = max_length
+
+        # sequences longer than `max_length` are truncated keeping the first words, empty sequences keep a single padding index
+        self.lengths: np.ndarray = np.diff(self.offsets)
+        if max_length is not None:
+            self.lengths = np.minimum(self.lengths, max_length)
+        self.lengths = np.maximum(self.lengths, 1)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __getitem__(self, index: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        start: int = int(self.offsets[index])
+        end: int = min(int(self.offsets[index + 1]), start + int(self.lengths[index]))
+        sequence: np.ndarray = np.asarray(self.indices[start:end], dtype=np.int64)
+        if len(sequence) == 0:
+            sequence = np.array([PADDING_INDEX], dtype=np.int64)
+        return torch.from_numpy(sequence), torch.tensor(self.labels[index])
+
+
+class BucketBatchSampler(Sampler):
+    """
+    Batch sampler that groups sequences of similar length, so that each batch is padded only up to its longest sequence
+    """
+
+    def __init__(self, lengths: np.ndarray, batch_size: int, shuffle: bool = True, bucket_size_multiplier: int = 100, drop_last: bool = False) -> None:
+        super().__init__()
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.bucket_size = batch_size * bucket_size_multiplier
+        self.drop_last = drop_last
+
+    def __iter__(self) -> Iterator[List[int]]:
+        indices: np.ndarray = np.random.permutation(len(self.lengths)) if self.shuffle else np.arange(len(self.lengths))
+        batches: List[np.ndarray] = []
+        for bucket_start in range(0, len(indices), self.bucket_size):  # sort only inside each bucket to keep some randomness among the batches
+            bucket: np.ndarray = indices[bucket_start:bucket_start + self.bucket_size]
+            bucket = bucket[np.argsort(self.lengths[bucket], kind="stable")]
+            for batch_start in range(0, len(bucket), self.batch_size):
+                batch: np.ndarray = bucket[batch_start:batch_start + self.batch_size]
+                if len(batch) == self.batch_size or not self.drop_last:
+                    batches.append(batch)
+
+        if self.shuffle:
+            batches = [batches[batch_index] for batch_index in np.random.permutation(len(batches))]
+
+        for batch in batches:
+            yield batch.tolist()
+
+    def __len__(self) -> int:
+        full_buckets, last_bucket = divmod(len(self.lengths), self.bucket_size)
+        batches_per_bucket: int = self.bucket_size // self.batch_size
+        if self.drop_last:
+            return full_buckets * batches_per_bucket + last_bucket // self.batch_size
+        return full_buckets * batches_per_bucket + -(-last_bucket // self.batch_size)
+
+
+def pad_batch(sequences: List[torch.Tensor]) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    right-pad the sequences up to the longest one of the batch
+    :param sequences: list of 1-dimensional tensors of indices
+    :return: padded tensor of shape (batch size, longest length) and the lengths of the sequences
+    """
+    lengths: torch.Tensor = torch.tensor([len(sequence) for sequence in sequences], dtype=torch.long)
+    padded_sequences: torch.Tensor = pad_sequence(sequences, batch_first=True, padding_value=PADDING_INDEX)
+    if padded_sequences.size(1) < MIN_PADDED_LENGTH:
+        padded_sequences = torch.nn.functional.pad(padded_sequences, (0, MIN_PADDED_LENGTH - padded_sequences.size(1)), value=PADDING_INDEX)
+    return padded_sequences, lengths
+
+
+def collate_padded(batch: List[Tuple[torch.Tensor, torch.Tensor]]) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    sequences, labels = zip(*batch)
+    padded_sequences, lengths = pad_batch(list(sequences))
+    return padded_sequences, lengths, torch.stack(labels)
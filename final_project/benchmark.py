@@ -0,0 +1,74 @@
+from __future__ import absolute_import, annotations
+
+import time
+from typing import Dict, Callable
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from models import ObjectivityCNN, FusedObjectivityCNN
+from preprocessing import PADDING_INDEX
+
+
+def latency_per_batch(forward: Callable[[], torch.tensor], repetitions: int = 20, warmup: int = 3) -> float:
+    """
+    measure the median latency of an inference call on CPU
+    :param forward: function running the model on a batch
+    :param repetitions: number of measured calls
+    :param warmup: number of calls before the measured ones
+    :return: median milliseconds per batch
+    """
+    timings = []
+    with torch.inference_mode():
+        for repetition in range(warmup + repetitions):
+            start: float = time.perf_counter()
+            forward()
+            if repetition >= warmup:
+                timings.append(time.perf_counter() - start)
+
+    return 1000 * float(np.median(timings))
+
+
+def random_batch(batch_size: int, sequence_length: int, vocabulary_size: int, random_state: np.random.RandomState) -> Dict[str, torch.tensor]:
+    # right-padded batch of random lengths, as produced by `pad_batch`
+    lengths = torch.from_numpy(random_state.randint(1, sequence_length + 1, size=batch_size)).long()
+    lengths[0] = sequence_length
+    x = torch.from_numpy(random_state.randint(1, vocabulary_size, size=(batch_size, sequence_length))).long()
+    x[torch.arange(sequence_length).unsqueeze(0) >= lengths.unsqueeze(1)] = PADDING_INDEX
+    return {"x": x, "lengths": lengths}
+
+
+def compare_cnns(embedding_matrix: np.ndarray, filters_number: int = 64, batch_sizes: tuple = (1, 32, 256), sequence_lengths: tuple = (16, 64, 384), threads: int = 1, random_seed: int = 42) -> None:
+    """
+    check that FusedObjectivityCNN gives the same outputs as ObjectivityCNN and compare their CPU latency per batch
+    :param embedding_matrix: embedding matrix of the models
+    :param filters_number: number of filters of each width
+    :param batch_sizes: batch sizes to measure
+    :param sequence_lengths: padded lengths to measure
+    :param threads: number of intra-op threads used by PyTorch
+    :param random_seed: seed of the weights and of the batches
+    """
+    torch.set_num_threads(threads)
+    torch.manual_seed(random_seed)
+    random_state: np.random.RandomState = np.random.RandomState(random_seed)
+    model: nn.Module = ObjectivityCNN(output_size=2, embedding_matrix=embedding_matrix, filters_number=filters_number).eval()
+    fused_model: nn.Module = FusedObjectivityCNN(output_size=2, embedding_matrix=embedding_matrix, filters_number=filters_number).eval()
+    fused_model.load_state_dict(model.state_dict())
+
+    print(f"{'batch size':>10}{'length':>8}{'ObjectivityCNN (ms)':>22}{'FusedObjectivityCNN (ms)':>27}{'max difference':>17}")
+    for batch_size in batch_sizes:
+        for sequence_length in sequence_lengths:
+            batch: Dict[str, torch.tensor] = random_batch(batch_size, sequence_length, len(embedding_matrix), random_state)
+            with torch.inference_mode():
+                difference: float = (model(**batch) - fused_model(**batch)).abs().max().item()
+            if not np.isclose(difference, 0.0, atol=1e-4):
+                raise ValueError(f"Output Mismatch: batch size: {batch_size} & length: {sequence_length} & difference: {difference}")
+
+            milliseconds: float = latency_per_batch(lambda: model(**batch))
+            fused_milliseconds: float = latency_per_batch(lambda: fused_model(**batch))
+            print(f"{batch_size:>10}{sequence_length:>8}{milliseconds:>22.3f}{fused_milliseconds:>27.3f}{difference:>17.2e}")
+
+
+if __name__ == "__main__":
+    compare_cnns(np.random.RandomState(0).normal(size=(20000, 300)).astype(np.float32))
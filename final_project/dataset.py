@@ -0,0 +1,171 @@
+from __future__ import absolute_import, annotations
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Iterator, Optional
+
+import numpy as np
+
+
+DATA_DIRECTORY: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CACHE_DIRECTORY: str = os.path.join(DATA_DIRECTORY, "cache")
+
+IMDB_LABELS: Dict[str, int] = {"neg": 0, "pos": 1}
+ITERATION_BLOCK_SIZE: int = 10000  # texts decoded together when iterating over a store
+ROTTEN_IMDB_FILES: Dict[str, int] = {"plot.tok.gt9.5000": 1, "quote.tok.gt9.5000": 0}  # objective sentences are labelled with 1, subjective ones with 0
+
+
+class ReviewStore:
+    """
+    Read-only collection of texts stored as a single concatenated UTF-8 buffer plus offsets and labels
+    """
+
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray, labels: np.ndarray) -> None:
+        if len(offsets) != len(labels) + 1:
+            raise ValueError(f"Size Mismatch: offsets: {len(offsets)} & labels: {len(labels)}")
+
+        self.buffer = buffer
+        self.offsets = offsets
+        self.labels = labels
+
+    @classmethod
+    def from_texts(cls, texts: List[str], labels: List[int]) -> ReviewStore:
+        encoded_texts: List[bytes] = [text.encode("utf-8") for text in texts]
+        offsets: np.ndarray = np.zeros(len(encoded_texts) + 1, dtype=np.int64)
+        np.cumsum([len(encoded_text) for encoded_text in encoded_texts], out=offsets[1:])
+        buffer: np.ndarray = np.frombuffer(b"".join(encoded_texts), dtype=np.uint8)
+        return cls(buffer, offsets, np.asarray(labels, dtype=np.int8))
+
+    @classmethod
+    def load(cls, directory: str) -> ReviewStore:
+        # the arrays are memory-mapped, so only the pages that are actually read are loaded
+        return cls(
+            np.load(os.path.join(directory, "buffer.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "labels.npy"), mmap_mode="r")
+        )
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "buffer.npy"), self.buffer)
+        np.save(os.path.join(directory, "offsets.npy"), self.offsets)
+        np.save(os.path.join(directory, "labels.npy"), self.labels)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __getitem__(self, index: int) -> str:
+        return self.buffer[self.offsets[index]:self.offsets[index + 1]].tobytes().decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        # the texts are decoded in blocks, so that streaming a large store (e.g. to `StreamingBaseline.fit`) never copies its whole buffer
+        offsets: List[int] = self.offsets.tolist()
+        for block_start in range(0, len(offsets) - 1, ITERATION_BLOCK_SIZE):
+            block_offsets: List[int] = offsets[block_start:block_start + ITERATION_BLOCK_SIZE + 1]
+            raw_block: bytes = self.buffer[block_offsets[0]:block_offsets[-1]].tobytes()
+            for start, end in zip(block_offsets[:-1], block_offsets[1:]):
+                yield raw_block[start - block_offsets[0]:end - block_offsets[0]].decode("utf-8")
+
+    def texts(self) -> List[str]:
+        # copy the buffer only once and then slice it, instead of decoding from the memory-map one text at a time
+        raw_buffer: bytes = self.buffer.tobytes()
+        offsets: List[int] = self.offsets.tolist()
+        return [raw_buffer[offsets[index]:offsets[index + 1]].decode("utf-8") for index in range(len(offsets) - 1)]
+
+
+def _read_text_file(path: str) -> str:
+    with open(path, encoding="utf-8") as file_to_read:
+        return file_to_read.read()
+
+
+def _fingerprint(paths: List[str]) -> List[List[int]]:
+    # adding, removing or renaming a file changes the modification time of its directory, editing a file in place changes only its own modification time and size
+    fingerprint: List[List[int]] = []
+    for path in paths:
+        path_stat: os.stat_result = os.stat(path)
+        files: List[os.stat_result] = [entry.stat() for entry in os.scandir(path) if entry.is_file()] if os.path.isdir(path) else [path_stat]
+        fingerprint.append([path_stat.st_mtime_ns, path_stat.st_size, len(files), sum(file_stat.st_mtime_ns for file_stat in files), sum(file_stat.st_size for file_stat in files)])
+    return fingerprint
+
+
+def _load_cached(name: str, source_paths: List[str], cache_directory: Optional[str], refresh: bool) -> Optional[ReviewStore]:
+    store_directory: str = os.path.join(cache_directory or CACHE_DIRECTORY, name)
+    metadata_path: str = os.path.join(store_directory, "metadata.json")
+    if refresh or not os.path.isfile(metadata_path):
+        return None
+
+    with open(metadata_path) as metadata_file:
+        metadata: dict = json.load(metadata_file)
+
+    if metadata.get("fingerprint") != _fingerprint(source_paths):
+        return None
+
+    return ReviewStore.load(store_directory)
+
+
+def _save_cached(name: str, source_paths: List[str], cache_directory: Optional[str], store: ReviewStore) -> None:
+    store_directory: str = os.path.join(cache_directory or CACHE_DIRECTORY, name)
+    store.save(store_directory)
+    with open(os.path.join(store_directory, "metadata.json"), "w") as metadata_file:
+        json.dump({"fingerprint": _fingerprint(source_paths), "size": len(store)}, metadata_file)
+
+
+def load_imdb_reviews(split: str, data_directory: Optional[str] = None, cache_directory: Optional[str] = None, refresh: bool = False, workers: int = 16) -> ReviewStore:
+    """
+    load a split of the aclImdb dataset from the local directory tree, caching it the first time
+    :param split: `train` or `test`
+    :param data_directory: directory containing the `aclImdb` directory
+    :param cache_directory: directory where the cached stores are saved
+    :param refresh: rebuild the cached store even if it is up to date
+    :param workers: number of threads used for reading the review files
+    :return: store with the reviews and their labels (1 for positive, 0 for negative)
+    """
+    if split not in ["train", "test"]:
+        raise ValueError(f"Unexpected split {split} (expected `train` or `test`)")
+
+    split_directory: str = os.path.join(data_directory or DATA_DIRECTORY, "aclImdb", split)
+    label_directories: List[str] = [os.path.join(split_directory, label) for label in IMDB_LABELS]
+    store: Optional[ReviewStore] = _load_cached(f"imdb_{split}", label_directories, cache_directory, refresh)
+    if store is not None:
+        return store
+
+    paths: List[str] = []
+    labels: List[int] = []
+    for label, label_directory in zip(IMDB_LABELS.values(), label_directories):
+        file_names: List[str] = sorted(os.listdir(label_directory))
+        paths.extend(os.path.join(label_directory, file_name) for file_name in file_names)
+        labels.extend([label] * len(file_names))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:  # reading many small files is I/O bound, so threads are enough
+        reviews: List[str] = list(executor.map(_read_text_file, paths))
+
+    store = ReviewStore.from_texts(reviews, labels)
+    _save_cached(f"imdb_{split}", label_directories, cache_directory, store)
+    return store
+
+
+def load_rotten_imdb(data_directory: Optional[str] = None, cache_directory: Optional[str] = None, refresh: bool = False) -> ReviewStore:
+    """
+    load the Rotten_IMDB subjectivity dataset from the local directory tree, caching it the first time
+    :param data_directory: directory containing the `rotten_imdb` directory
+    :param cache_directory: directory where the cached stores are saved
+    :param refresh: rebuild the cached store even if it is up to date
+    :return: store with the stripped and lowercased sentences and their labels (1 for objective, 0 for subjective)
+    """
+    file_paths: List[str] = [os.path.join(data_directory or DATA_DIRECTORY, "rotten_imdb", file_name) for file_name in ROTTEN_IMDB_FILES]
+    store: Optional[ReviewStore] = _load_cached("rotten_imdb", file_paths, cache_directory, refresh)
+    if store is not None:
+        return store
+
+    sentences: List[str] = []
+    labels: List[int] = []
+    for label, file_path in zip(ROTTEN_IMDB_FILES.values(), file_paths):
+        with open(file_path, encoding="ISO-8859-1") as file_to_read:
+            file_sentences: List[str] = [line.strip().lower() for line in file_to_read]
+        sentences.extend(file_sentences)
+        labels.extend([label] * len(file_sentences))
+
+    store = ReviewStore.from_texts(sentences, labels)
+    _save_cached("rotten_imdb", file_paths, cache_directory, store)
+    return store
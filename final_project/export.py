@@ -0,0 +1,255 @@
+from __future__ import absolute_import, annotations
+
+import argparse
+import copy
+import io
+import json
+import os
+import time
+from typing import List, Dict, Tuple, Callable, Optional
+
+import numpy as np
+import torch
+import torch.nn as nn
+from sklearn.model_selection import train_test_split
+
+from batching import BucketBatchSampler, pad_batch, SequenceDataset
+from dataset import CACHE_DIRECTORY, load_imdb_reviews, load_rotten_imdb
+from filtering import join_subjective_sentences, split_sentences
+from models import ObjectivityNetwork, ObjectivityCNN, FusedObjectivityCNN, SentimentNetwork, FusedSentimentCNN
+from preprocessing import clean_review, encode_texts, load_embedding_store
+from sentencizer import spacy_sentencizer
+
+
+# the CNNs are exported with their fused variant, that has the same parameters and does not depend on the padded length when traced
+EXPORTABLE_MODELS: Dict[str, type] = {
+    "ObjectivityNetwork": ObjectivityNetwork,
+    "ObjectivityCNN": FusedObjectivityCNN,
+    "SentimentNetwork": SentimentNetwork,
+    "SentimentCNN": FusedSentimentCNN
+}
+# maximum number of words kept for each text when the models are trained in the notebook (sentences for objectivity, reviews for sentiment)
+SEQUENCE_LENGTHS: Dict[str, int] = {
+    "ObjectivityNetwork": 128,
+    "ObjectivityCNN": 128,
+    "SentimentNetwork": 384,
+    "SentimentCNN": 384
+}
+
+SCRIPTED_FILE: str = "model.pt"
+QUANTIZED_FILE: str = "model.quantized.pt"
+METADATA_FILE: str = "metadata.json"
+WORD_TO_INDEX_FILE: str = "word_to_index.json"
+
+# lengths of the sequences of the example batch used for tracing and of the one used for checking the trace (different batch size and padded length)
+TRACE_LENGTHS: Tuple[int, ...] = (12, 5, 9)
+CHECK_LENGTHS: Tuple[int, ...] = (30, 1, 7, 22, 3)
+CHECK_TOLERANCE: float = 1e-4
+
+
+class InferenceModule(nn.Module):
+    """
+    Wrapper giving the same `(indices, lengths) -> logits` interface to all the classifiers, so that they can be traced
+    """
+
+    def __init__(self, model: nn.Module) -> None:
+        super().__init__()
+        self.model = model
+
+    def forward(self, x: torch.tensor, lengths: torch.tensor) -> torch.tensor:
+        if isinstance(self.model, ObjectivityCNN):
+            return self.model(x, lengths)
+
+        # the initial hidden state is built from the batch size, so that the traced model accepts any batch size
+        hidden = torch.zeros((2 * self.model.layers_number, x.size(0), self.model.hidden_dimension), device=x.device)
+        out, _ = self.model(x, lengths, hidden)
+        return out
+
+
+def quantize(model: nn.Module) -> nn.Module:
+    # dynamic int8 quantization: the weights of the GRU and linear layers are stored as int8, the activations are quantized on the fly
+    return torch.ao.quantization.quantize_dynamic(copy.deepcopy(model).cpu().eval(), {nn.GRU, nn.Linear}, dtype=torch.qint8)
+
+
+def trace(model: nn.Module) -> torch.jit.ScriptModule:
+    """
+    trace the model for CPU inference, checking that the trace does not depend on the shapes of the example batch
+    :param model: model to trace (fp32 or quantized)
+    :return: the traced module, whose outputs are checked against the eager ones on a batch of another size and padded length
+    """
+    # the example batch has sequences of different lengths, so that the packing of the GRU inputs is traced as well
+    example_x, example_lengths = pad_batch([torch.arange(1, length + 1) for length in TRACE_LENGTHS])
+    check_x, check_lengths = pad_batch([torch.arange(length, 0, -1) for length in CHECK_LENGTHS])
+    module: InferenceModule = InferenceModule(copy.deepcopy(model).cpu().eval()).eval()
+    with torch.no_grad():
+        # the tracer warnings are kept, `check_inputs` makes the trace fail if the outputs or the graph change with the batch size or the length
+        traced: torch.jit.ScriptModule = torch.jit.trace(module, (example_x, example_lengths), check_inputs=[(check_x, check_lengths)], check_tolerance=CHECK_TOLERANCE)
+        difference: float = (traced(check_x, check_lengths) - module(check_x, check_lengths)).abs().max().item()
+    if difference > CHECK_TOLERANCE:
+        raise ValueError(f"Trace Mismatch: the traced {type(model).__name__} differs from the eager one by {difference} on a batch of {len(CHECK_LENGTHS)} sequences of up to {max(CHECK_LENGTHS)} words")
+    return traced
+
+
+def export_model(model: nn.Module, word_to_index: Dict[str, int], sequence_length: int, directory: str) -> None:
+    """
+    save the traced model and its dynamically quantized version for CPU inference, together with what is needed for encoding the texts
+    :param model: trained ObjectivityNetwork, SentimentNetwork or (fused) CNN
+    :param word_to_index: mapping from word to row of the embedding matrix of the model
+    :param sequence_length: maximum number of words kept for each text
+    :param directory: directory where the exported files are saved
+    """
+    if isinstance(model, ObjectivityCNN) and not isinstance(model, FusedObjectivityCNN):
+        raise ValueError(f"Unsupported Model: {type(model).__name__} (export the fused variant loading the same state dict)")
+
+    os.makedirs(directory, exist_ok=True)
+    torch.jit.save(trace(model), os.path.join(directory, SCRIPTED_FILE))
+    torch.jit.save(trace(quantize(model)), os.path.join(directory, QUANTIZED_FILE))
+
+    metadata: Dict[str, object] = {
+        "model": type(model).__name__,
+        "output_size": model.output_size,
+        "embedding_size": model.embedding_size,
+        "vocabulary_size": model.embedding.num_embeddings,
+        "sequence_length": sequence_length
+    }
+    with open(os.path.join(directory, METADATA_FILE), "w", encoding="utf-8") as metadata_file:
+        json.dump(metadata, metadata_file, indent=2)
+    with open(os.path.join(directory, WORD_TO_INDEX_FILE), "w", encoding="utf-8") as word_to_index_file:
+        json.dump(word_to_index, word_to_index_file, ensure_ascii=False)
+
+
+def _predict_logits(forward: Callable[[torch.tensor, torch.tensor], torch.tensor], texts: List[str], word_to_index: Dict[str, int], sequence_length: int, batch_size: int) -> Tuple[np.ndarray, int]:
+    dataset: SequenceDataset = SequenceDataset(*encode_texts(texts, word_to_index), [0] * len(texts), max_length=sequence_length)
+    logits: Optional[np.ndarray] = None
+    batches: int = 0
+    with torch.inference_mode():
+        for batch in BucketBatchSampler(dataset.lengths, batch_size, shuffle=False):
+            padded_texts, lengths = pad_batch([dataset[index][0] for index in batch])
+            outputs: np.ndarray = forward(padded_texts, lengths).numpy()
+            if logits is None:
+                logits = np.zeros((len(texts), outputs.shape[1]), dtype=np.float32)
+            logits[batch] = outputs
+            batches += 1
+
+    return logits if logits is not None else np.zeros((0, 0), dtype=np.float32), batches
+
+
+class ExportedClassifier:
+    """
+    Classifier loaded from the files saved by `export_model`, running on CPU without the notebook and without the model classes
+    """
+
+    def __init__(self, directory: str, quantized: bool = True) -> None:
+        with open(os.path.join(directory, METADATA_FILE), encoding="utf-8") as metadata_file:
+            self.metadata: Dict[str, object] = json.load(metadata_file)
+        with open(os.path.join(directory, WORD_TO_INDEX_FILE), encoding="utf-8") as word_to_index_file:
+            self.word_to_index: Dict[str, int] = json.load(word_to_index_file)
+        self.sequence_length: int = self.metadata["sequence_length"]
+        self.model_path: str = os.path.join(directory, QUANTIZED_FILE if quantized else SCRIPTED_FILE)
+        self.module: torch.jit.ScriptModule = torch.jit.load(self.model_path, map_location="cpu").eval()
+
+    def logits(self, texts: List[str], batch_size: int = 1024) -> np.ndarray:
+        return _predict_logits(self.module, texts, self.word_to_index, self.sequence_length, batch_size)[0]
+
+    def predict(self, texts: List[str], batch_size: int = 1024) -> np.ndarray:
+        """
+        classify the texts (encoded splitting them on whitespaces, as in the notebook)
+        :param texts: texts to classify
+        :param batch_size: number of texts classified together
+        :return: predicted label of each text
+        """
+        return self.logits(texts, batch_size).argmax(1)
+
+
+def _serialized_size(model: nn.Module) -> float:
+    buffer: io.BytesIO = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return len(buffer.getvalue()) / 2 ** 20
+
+
+def compare_variants(model: nn.Module, directory: str, texts: List[str], labels: np.ndarray, batch_size: int = 1024) -> str:
+    """
+    compare accuracy, latency and size of the fp32 eager model with its exported traced and quantized versions
+    :param model: model exported in the directory
+    :param directory: directory where the model has been exported with `export_model`
+    :param texts: test texts
+    :param labels: test labels
+    :param batch_size: number of texts classified together
+    :return: the comparison table
+    """
+    scripted: ExportedClassifier = ExportedClassifier(directory, quantized=False)
+    quantized: ExportedClassifier = ExportedClassifier(directory, quantized=True)
+    variants: List[Tuple[str, Callable[[torch.tensor, torch.tensor], torch.tensor], float]] = [
+        ("fp32 eager", InferenceModule(copy.deepcopy(model).cpu().eval()).eval(), _serialized_size(model)),
+        ("fp32 traced", scripted.module, os.path.getsize(scripted.model_path) / 2 ** 20),
+        ("int8 dynamic quantized", quantized.module, os.path.getsize(quantized.model_path) / 2 ** 20)
+    ]
+
+    rows: List[str] = [f"{'variant':<24}{'accuracy':>10}{'ms per batch':>14}{'size (MiB)':>12}"]
+    for name, forward, size in variants:
+        start: float = time.perf_counter()
+        logits, batches = _predict_logits(forward, texts, scripted.word_to_index, scripted.sequence_length, batch_size)
+        milliseconds: float = 1000 * (time.perf_counter() - start) / max(batches, 1)
+        accuracy: float = float((logits.argmax(1) == np.asarray(labels)).mean()) if len(texts) > 0 else 0.0
+        rows.append(f"{name:<24}{accuracy:>10.4f}{milliseconds:>14.2f}{size:>12.2f}")
+    return "\n".join(rows)
+
+
+def _test_split(model_name: str, objectivity_directory: Optional[str] = None) -> Tuple[List[str], np.ndarray]:
+    if model_name.startswith("Objectivity"):  # same split of the notebook
+        rotten_imdb_store = load_rotten_imdb()
+        _, texts, _, labels = train_test_split(rotten_imdb_store.texts(), rotten_imdb_store.labels, test_size=0.2, random_state=42)
+        return list(texts), np.asarray(labels, dtype=np.int64)
+
+    test_store = load_imdb_reviews("test")
+    if objectivity_directory is None:
+        return [clean_review(review) for review in test_store.texts()], np.asarray(test_store.labels, dtype=np.int64)
+
+    # the sentiment models are trained on the reviews without their objective sentences, removed here with the exported objectivity classifier
+    sentences, offsets = split_sentences(test_store.texts(), spacy_sentencizer())
+    objectivity: np.ndarray = ExportedClassifier(objectivity_directory).predict(sentences) == 1 if len(sentences) > 0 else np.zeros(0, dtype=bool)
+    return join_subjective_sentences(sentences, offsets, objectivity), np.asarray(test_store.labels, dtype=np.int64)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export a trained classifier for CPU inference (traced fp32 and dynamically quantized int8)")
+    parser.add_argument("model", choices=list(EXPORTABLE_MODELS), help="class of the trained model")
+    parser.add_argument("weights", help="state dict saved with `torch.save(model.state_dict(), ...)`")
+    parser.add_argument("output", help="directory where the exported model is saved")
+    parser.add_argument("--embeddings", default=os.path.join(CACHE_DIRECTORY, "embeddings"), help="embedding store used for training the model")
+    parser.add_argument("--sequence-length", type=int, default=None, help="maximum number of words kept for each text (by default the one used in the notebook for the model)")
+    parser.add_argument("--hidden-dimension", type=int, default=128, help="hidden dimension of the GRU networks")
+    parser.add_argument("--layers-number", type=int, default=3, help="number of layers of the GRU networks")
+    parser.add_argument("--filters-number", type=int, default=64, help="number of filters of each width of the CNNs")
+    parser.add_argument("--threads", type=int, default=None, help="number of intra-op threads used by PyTorch")
+    parser.add_argument("--compare", action="store_true", help="compare the variants on the rotten_imdb test split (IMDB test split for the sentiment models)")
+    parser.add_argument("--objectivity", default=None, help="exported objectivity classifier removing the objective sentences of the IMDB test reviews before comparing the sentiment models, as in the notebook")
+    arguments = parser.parse_args()
+
+    if arguments.threads is not None:
+        torch.set_num_threads(arguments.threads)
+
+    word_to_index, embedding_matrix = load_embedding_store(arguments.embeddings)
+    model_class: type = EXPORTABLE_MODELS[arguments.model]
+    if issubclass(model_class, ObjectivityCNN):
+        model: nn.Module = model_class(output_size=2, embedding_matrix=embedding_matrix, filters_number=arguments.filters_number)
+    else:
+        model = model_class(output_size=2, embedding_matrix=embedding_matrix, hidden_dimension=arguments.hidden_dimension, layers_number=arguments.layers_number)
+    model.load_state_dict(torch.load(arguments.weights, map_location="cpu"))
+    model.eval()
+
+    sequence_length: int = arguments.sequence_length if arguments.sequence_length is not None else SEQUENCE_LENGTHS[arguments.model]
+    export_model(model, word_to_index, sequence_length, arguments.output)
+    print(f"{arguments.model} exported to {arguments.output} (sequence length {sequence_length})")
+    if arguments.compare:
+        if arguments.model.startswith("Objectivity"):
+            print("comparison on the rotten_imdb test split:")
+        elif arguments.objectivity is not None:
+            print("comparison on the IMDB test reviews without their objective sentences (as used for training):")
+        else:
+            print("comparison on the unfiltered IMDB test reviews (the model is trained on the reviews without their objective sentences, pass --objectivity to remove them):")
+        print(compare_variants(model, arguments.output, *_test_split(arguments.model, arguments.objectivity)))
+
+
+if __name__ == "__main__":
+    main()
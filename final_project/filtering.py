@@ -0,0 +1,98 @@
+from __future__ import absolute_import, annotations
+
+from typing import List, Dict, Iterable, Tuple, Union, TYPE_CHECKING
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from batching import BucketBatchSampler, pad_batch, SequenceDataset
+from models import ObjectivityCNN
+from preprocessing import clean_review, encode_texts
+from sentencizer import RuleSentencizer
+
+if TYPE_CHECKING:
+    from spacy import Language
+
+
+def split_sentences(reviews: Iterable[str], nlp: Union[Language, RuleSentencizer], clean: bool = True, batch_size: int = 256, n_process: int = 1) -> Tuple[List[str], np.ndarray]:
+    """
+    split all the reviews into sentences with a single `nlp.pipe` call
+    :param reviews: reviews to split
+    :param nlp: spaCy pipeline with a sentencizer (the other components are disabled while splitting) or `RuleSentencizer`
+    :param clean: clean the reviews with `clean_review` before splitting them
+    :param batch_size: number of reviews processed together by spaCy
+    :param n_process: number of processes used by spaCy
+    :return: sentences of all the reviews and the offsets of the sentences of each review
+    """
+    sentences: List[str] = []
+    offsets: List[int] = [0]
+    if isinstance(nlp, RuleSentencizer):
+        for review_sentences in nlp.pipe(clean_review(review) if clean else review for review in reviews):
+            sentences.extend(review_sentences)
+            offsets.append(len(sentences))
+        return sentences, np.array(offsets, dtype=np.int64)
+
+    with nlp.select_pipes(enable=[pipe_name for pipe_name in nlp.pipe_names if pipe_name == "sentencizer"]):
+        for doc in nlp.pipe((clean_review(review) if clean else review for review in reviews), batch_size=batch_size, n_process=n_process):
+            sentences.extend(sentence.text for sentence in doc.sents)
+            offsets.append(len(sentences))
+
+    return sentences, np.array(offsets, dtype=np.int64)
+
+
+def predict_objectivity(model: nn.Module, sentences: List[str], word_to_index: Dict[str, int], sequence_length: int, device: torch.device, batch_size: int = 1024) -> np.ndarray:
+    """
+    classify the sentences as objective or subjective in large inference batches of sentences of similar length
+    :param model: trained `ObjectivityNetwork` or `ObjectivityCNN`
+    :param sentences: sentences to classify
+    :param word_to_index: mapping from word to row of the embedding matrix
+    :param sequence_length: maximum number of words kept for each sentence
+    :param device: device where the model is
+    :param batch_size: number of sentences classified together
+    :return: boolean array that is True for the objective sentences
+    """
+    model.eval()
+    dataset: SequenceDataset = SequenceDataset(*encode_texts(sentences, word_to_index), [0] * len(sentences), max_length=sequence_length)
+    objectivity: np.ndarray = np.zeros(len(sentences), dtype=bool)
+    with torch.inference_mode():
+        for batch in BucketBatchSampler(dataset.lengths, batch_size, shuffle=False):
+            padded_sentences, lengths = pad_batch([dataset[index][0] for index in batch])
+            if isinstance(model, ObjectivityCNN):
+                outputs = model(padded_sentences.to(device), lengths)
+            else:  # without an initial hidden state the GRU starts from zeros, so no state is allocated or carried between batches
+                outputs, _ = model(padded_sentences.to(device), lengths, None)
+            objectivity[batch] = (outputs.argmax(1) == 1).cpu().numpy()
+
+    return objectivity
+
+
+def objectivity_remotion(model: nn.Module, reviews: List[str], nlp: Union[Language, RuleSentencizer], word_to_index: Dict[str, int], sequence_length: int, device: torch.device, batch_size: int = 1024, n_process: int = 1) -> List[str]:
+    """
+    remove the objective sentences from the reviews, classifying the sentences of all the reviews together
+    :param model: trained `ObjectivityNetwork` or `ObjectivityCNN`
+    :param reviews: reviews to filter
+    :param nlp: spaCy pipeline with a sentencizer or `RuleSentencizer`
+    :param word_to_index: mapping from word to row of the embedding matrix
+    :param sequence_length: maximum number of words kept for each sentence
+    :param device: device where the model is
+    :param batch_size: number of sentences classified together
+    :param n_process: number of processes used by spaCy for splitting the sentences
+    :return: the subjective text of each review (all its sentences if they are all classified as objective)
+    """
+    sentences, offsets = split_sentences(reviews, nlp, n_process=n_process)
+    objectivity: np.ndarray = predict_objectivity(model, sentences, word_to_index, sequence_length, device, batch_size=batch_size)
+    return join_subjective_sentences(sentences, offsets, objectivity)
+
+
+def join_subjective_sentences(sentences: List[str], offsets: np.ndarray, objectivity: np.ndarray) -> List[str]:
+    # join again the sentences of each review that are not classified as objective
+    subjective_texts: List[str] = []
+    for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+        review_objectivity: np.ndarray = objectivity[start:end]
+        if review_objectivity.all():  # Maintain all the sententences if all are classified as objectives
+            subjective_texts.append(" ".join(sentences[start:end]))
+        else:
+            subjective_texts.append(" ".join([sentences[index] for index in range(start, end) if not objectivity[index]]))
+
+    return subjective_texts
@@ -0,0 +1,107 @@
+from __future__ import absolute_import, annotations
+
+import argparse
+import asyncio
+import json
+import time
+from typing import List, Dict, Tuple, Optional
+
+import numpy as np
+
+from dataset import load_imdb_reviews
+
+
+async def _post(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, path: str, payload: Optional[Dict[str, object]] = None) -> Tuple[int, object]:
+    body: bytes = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    method: str = "POST" if payload is not None else "GET"
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+
+    status: int = int((await reader.readline()).split()[1])
+    headers: Dict[str, str] = {}
+    while True:
+        line: bytes = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, value = line.decode("latin-1").split(":", 1)
+        headers[name.strip().lower()] = value.strip()
+    return status, json.loads(await reader.readexactly(int(headers.get("content-length", 0))))
+
+
+async def _connect(host: str, port: int, unix_socket: Optional[str]) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    if unix_socket is not None:
+        return await asyncio.open_unix_connection(unix_socket)
+    return await asyncio.open_connection(host, port)
+
+
+async def _client(reviews: List[str], requests_number: int, reviews_per_request: int, random_state: np.random.RandomState, host: str, port: int, unix_socket: Optional[str], latencies: List[float], statuses: Dict[int, int]) -> None:
+    # every client keeps its connection open and sends its requests one after the other
+    reader, writer = await _connect(host, port, unix_socket)
+    try:
+        for _ in range(requests_number):
+            request_reviews: List[str] = [reviews[index] for index in random_state.randint(len(reviews), size=reviews_per_request)]
+            start: float = time.perf_counter()
+            status, _ = await _post(reader, writer, "/predict", {"reviews": request_reviews})
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def generate_load(reviews: List[str], clients: int = 32, requests_per_client: int = 20, reviews_per_request: int = 1, host: str = "127.0.0.1", port: int = 8080, unix_socket: Optional[str] = None, random_seed: int = 42) -> Dict[str, object]:
+    """
+    send concurrent requests to the review server and measure their latency from the client side
+    :param reviews: reviews sampled for the requests
+    :param clients: number of concurrent clients
+    :param requests_per_client: number of requests sent by each client
+    :param reviews_per_request: number of reviews of each request
+    :param host: host of the server
+    :param port: port of the server
+    :param unix_socket: Unix socket of the server, used instead of host and port if given
+    :param random_seed: seed of the sampling of the reviews
+    :return: client-side counters and the counters of the server
+    """
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    start: float = time.perf_counter()
+    await asyncio.gather(*[
+        _client(reviews, requests_per_client, reviews_per_request, np.random.RandomState(random_seed + client), host, port, unix_socket, latencies, statuses)
+        for client in range(clients)
+    ])
+    elapsed: float = time.perf_counter() - start
+
+    reader, writer = await _connect(host, port, unix_socket)
+    try:
+        _, server_stats = await _post(reader, writer, "/stats")
+    finally:
+        writer.close()
+
+    milliseconds: np.ndarray = 1000 * np.asarray(latencies)
+    return {
+        "requests": len(latencies),
+        "statuses": statuses,
+        "p50 latency ms": float(np.percentile(milliseconds, 50)) if len(milliseconds) > 0 else 0.0,
+        "p99 latency ms": float(np.percentile(milliseconds, 99)) if len(milliseconds) > 0 else 0.0,
+        "requests per second": len(latencies) / elapsed,
+        "reviews per second": statuses.get(200, 0) * reviews_per_request / elapsed,
+        "server": server_stats
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Send concurrent requests with IMDB test reviews to the review server")
+    parser.add_argument("--host", default="127.0.0.1", help="host of the server")
+    parser.add_argument("--port", type=int, default=8080, help="port of the server")
+    parser.add_argument("--unix-socket", default=None, help="Unix socket of the server, used instead of host and port")
+    parser.add_argument("--clients", type=int, default=32, help="number of concurrent clients")
+    parser.add_argument("--requests", type=int, default=20, help="number of requests sent by each client")
+    parser.add_argument("--reviews-per-request", type=int, default=1, help="number of reviews of each request")
+    arguments = parser.parse_args()
+
+    reviews: List[str] = load_imdb_reviews("test").texts()
+    results: Dict[str, object] = asyncio.run(generate_load(reviews, arguments.clients, arguments.requests, arguments.reviews_per_request, arguments.host, arguments.port, arguments.unix_socket))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+from __future__ import absolute_import, annotations
+
+from typing import Dict, Optional
+
+import torch
+
+
+class ConfusionMatrix:
+    """
+    Accumulator of the confusion matrix (rows are labels, columns are predictions) and of the loss, updated with one tensor operation per batch
+    """
+
+    def __init__(self, classes_number: int = 2, device: Optional[torch.device] = None) -> None:
+        self.classes_number = classes_number
+        self.matrix = torch.zeros((classes_number, classes_number), dtype=torch.long, device=device)
+        self.total_loss = torch.zeros((), dtype=torch.float64, device=device)
+
+    def update(self, predicted: torch.tensor, labels: torch.tensor, loss: Optional[torch.tensor] = None) -> None:
+        # everything stays on the device, the values are read only once at the end of the epoch
+        cells = labels.long().to(self.matrix.device) * self.classes_number + predicted.long().to(self.matrix.device)
+        self.matrix += torch.bincount(cells, minlength=self.classes_number ** 2).view(self.classes_number, self.classes_number)
+        if loss is not None:
+            self.total_loss += loss.detach()
+
+    def scores(self) -> Dict[str, float]:
+        matrix = self.matrix.double().cpu()
+        true_positives = matrix.diagonal()
+        predictions = matrix.sum(dim=0)
+        labels = matrix.sum(dim=1)
+        precision = torch.where(predictions != 0, true_positives / predictions.clamp(min=1), torch.zeros_like(true_positives))
+        recall = torch.where(labels != 0, true_positives / labels.clamp(min=1), torch.zeros_like(true_positives))
+        f1_score = torch.where(precision + recall != 0, 2 * precision * recall / (precision + recall).clamp(min=1e-12), torch.zeros_like(true_positives))
+        samples = max(int(matrix.sum().item()), 1)
+
+        scores: Dict[str, float] = {
+            "loss": self.total_loss.item() / samples,
+            "accuracy": true_positives.sum().item() / samples,
+            "f1 score": f1_score.mean().item()
+        }
+        for label in range(self.classes_number):
+            scores[f"precision {label}"] = precision[label].item()
+            scores[f"recall {label}"] = recall[label].item()
+            scores[f"f1 score {label}"] = f1_score[label].item()
+        return scores
+
+    def f1_score(self) -> float:
+        return self.scores()["f1 score"]
+
+    def summary(self, prefix: str = "") -> str:
+        scores: Dict[str, float] = self.scores()
+        summary: str = f"{prefix}loss: {scores['loss']}, {prefix}accuracy: {scores['accuracy']}, {prefix}f1 score: {scores['f1 score']}"
+        if self.classes_number == 2:  # 1 is the positive class and 0 the negative one
+            return f"{summary} (positive: {scores['f1 score 1']}, negative: {scores['f1 score 0']})"
+        return f"{summary} ({', '.join(str(scores[f'f1 score {label}']) for label in range(self.classes_number))})"
@@ -0,0 +1,169 @@
+from __future__ import absolute_import, annotations
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.nn.utils.rnn import pack_padded_sequence
+
+from preprocessing import PADDING_INDEX
+
+
+def embedding_layer(embedding_matrix: np.ndarray) -> nn.Embedding:
+    # the word vectors are not trained, the layer only gathers the rows of the precomputed embedding matrix
+    return nn.Embedding.from_pretrained(torch.tensor(np.asarray(embedding_matrix, dtype=np.float32)), freeze=True, padding_idx=PADDING_INDEX)
+
+
+class ObjectivityNetwork(nn.Module):
+    """
+    This neural network will be used to perform Objectivity classification
+    """
+
+    def __init__(self, output_size: int, embedding_matrix: np.ndarray, hidden_dimension: int, layers_number: int) -> None:
+        super().__init__()
+        self.output_size = output_size
+        self.embedding_size = embedding_matrix.shape[1]
+        self.hidden_dimension = hidden_dimension
+        self.layers_number = layers_number
+
+        # Embedding layer
+        self.embedding = embedding_layer(embedding_matrix)
+
+        # GRU layer
+        self.gru = nn.GRU(self.embedding_size, hidden_dimension, layers_number, dropout=0.5, batch_first=True, bidirectional=True)
+
+        # Dropout and activation function layers
+        self.dropout = nn.Dropout(0.3)
+        self.activation = nn.LeakyReLU(0.1)
+
+        # Linear layers (working on the last hidden states of both directions, so they do not depend on the length of the sequences)
+        self.fc = nn.Linear(2 * hidden_dimension, hidden_dimension)
+        self.fc_out = nn.Linear(hidden_dimension, output_size)
+
+    def forward(self, x: torch.tensor, lengths: torch.tensor, hidden: torch.tensor) -> torch.tensor:
+        # the packed sequence makes the GRU stop at the real length of each sequence, skipping the padding
+        packed_x = pack_padded_sequence(self.embedding(x), lengths.cpu(), batch_first=True, enforce_sorted=False)
+        _, hidden = self.gru(packed_x, hidden)
+        out = self.dropout(torch.cat((hidden[-2], hidden[-1]), dim=1))
+        out = self.activation(out)
+        out = self.fc(out)
+        out = self.dropout(out)
+        out = self.activation(out)
+        out = self.fc_out(out)
+        return out, hidden
+
+
+class ObjectivityCNN(nn.Module):
+    """
+    This neural network will be used to perform Objectivity classification
+    """
+
+    def __init__(self, output_size: int, embedding_matrix: np.ndarray, filters_number: int) -> None:
+        super().__init__()
+        self.output_size = output_size
+        self.embedding_size = embedding_matrix.shape[1]
+        self.filters_number = filters_number
+
+        # Embedding layer
+        self.embedding = embedding_layer(embedding_matrix)
+
+        # Convolutional layers
+        self.convs = nn.ModuleList([nn.Conv1d(in_channels=self.embedding_size, out_channels=filters_number, kernel_size=filter_size) for filter_size in range(1, 9)])
+
+        # Dropout and activation function layers
+        self.dropout = nn.Dropout(p=0.4)
+        self.activation = nn.LeakyReLU(0.1)
+
+        # Classifier set of layers
+        self.classifier = nn.Sequential(
+            nn.BatchNorm1d(8 * filters_number),
+            self.activation,
+            self.dropout,
+            nn.Linear(8 * filters_number, 128),
+            nn.BatchNorm1d(128),
+            self.activation,
+            nn.Linear(128, output_size)
+        )
+
+    def forward(self, x: torch.tensor, lengths: Optional[torch.tensor] = None) -> torch.tensor:
+        x = self.embedding(x).swapaxes(1, 2)  # the convolutions need the embedding size as channels dimension
+        cnn_outputs = [conv(x) for conv in self.convs]
+        if lengths is not None:  # ignore the positions that cover only the padding added at the end of the shorter sequences of the batch
+            cnn_outputs = [cnn_out.masked_fill(self._padding_mask(cnn_out, lengths, conv.kernel_size[0]), float("-inf")) for cnn_out, conv in zip(cnn_outputs, self.convs)]
+        pooled_outputs = [nn.MaxPool1d(kernel_size=cnn_out.shape[2])(cnn_out).squeeze(2) for cnn_out in cnn_outputs]
+        out = self.classifier(torch.cat(pooled_outputs, dim=1))
+        return out
+
+    @staticmethod
+    def _padding_mask(cnn_out: torch.tensor, lengths: torch.tensor, kernel_size: int) -> torch.tensor:
+        # a sequence shorter than the kernel keeps its first position, as if it was padded with zeros
+        last_positions = torch.clamp(lengths.to(cnn_out.device) - kernel_size, min=0)
+        positions = torch.arange(cnn_out.size(2), device=cnn_out.device)
+        return (positions.unsqueeze(0) > last_positions.unsqueeze(1)).unsqueeze(1)
+
+
+class FusedObjectivityCNN(ObjectivityCNN):
+    """
+    ObjectivityCNN computing all the filter widths with a single convolution (same parameters, so it can load the weights of an ObjectivityCNN)
+    """
+
+    def __init__(self, output_size: int, embedding_matrix: np.ndarray, filters_number: int) -> None:
+        super().__init__(output_size, embedding_matrix, filters_number)
+        self._fused_cache = None
+
+    def forward(self, x: torch.tensor, lengths: Optional[torch.tensor] = None) -> torch.tensor:
+        x = self.embedding(x)
+        weight, bias, kernel_sizes, offsets = self._fused_parameters()
+        # a single product computes every kernel position of every width, then each width adds its shifted positions
+        products = torch.matmul(x, weight)
+        cnn_out = products[:, :, :offsets[1]] + bias
+        for shift in range(1, len(offsets) - 1):
+            cnn_out[:, :x.size(1) - shift, shift * self.filters_number:] += products[:, shift:, offsets[shift]:offsets[shift + 1]]
+        # the positions where a width would read past the end of the sequence (or of the batch) are ignored
+        if lengths is None:
+            lengths = torch.full((x.size(0),), x.size(1), dtype=torch.long)
+        last_positions = torch.clamp(lengths.to(cnn_out.device).unsqueeze(1) - kernel_sizes.unsqueeze(0), min=0)
+        positions = torch.arange(cnn_out.size(1), device=cnn_out.device)
+        cnn_out = cnn_out.masked_fill(positions.view(1, -1, 1) > last_positions.unsqueeze(1), float("-inf"))
+        out = self.classifier(cnn_out.amax(dim=1))
+        return out
+
+    def _fused_parameters(self) -> Tuple[torch.tensor, torch.tensor, torch.tensor, List[int]]:
+        # without gradients the fused parameters are built once and rebuilt only if the weights are updated or moved,
+        # while tracing they are always built from the parameters, so that they are not baked into the trace as constants
+        key = tuple((parameter.data_ptr(), parameter._version) for conv in self.convs for parameter in (conv.weight, conv.bias))
+        cached = not torch.is_grad_enabled() and not torch.jit.is_tracing()
+        if cached and self._fused_cache is not None and self._fused_cache[0] == key:
+            return self._fused_cache[1]
+
+        # the columns of the kernel position `shift` of all the widths larger than `shift` are stored together, starting at `offsets[shift]`
+        widest_kernel = max(conv.kernel_size[0] for conv in self.convs)
+        columns = [conv.weight[:, :, shift] for shift in range(widest_kernel) for conv in self.convs if conv.kernel_size[0] > shift]
+        weight = torch.cat(columns, dim=0).t()
+        offsets = [0]
+        for shift in range(widest_kernel):
+            offsets.append(offsets[-1] + self.filters_number * sum(conv.kernel_size[0] > shift for conv in self.convs))
+        bias = torch.cat([conv.bias for conv in self.convs], dim=0)
+        kernel_sizes = torch.tensor([conv.kernel_size[0] for conv in self.convs], device=weight.device).repeat_interleave(self.filters_number)
+        if cached:
+            self._fused_cache = (key, (weight, bias, kernel_sizes, offsets))
+        return weight, bias, kernel_sizes, offsets
+
+
+class SentimentNetwork(ObjectivityNetwork):
+    """
+    This neural network will be used to perform sentiment-polarity classification (using the same structure as for objectivity detection)
+    """
+
+
+class SentimentCNN(ObjectivityCNN):
+    """
+    This neural network will be used to perform sentiment-polarity classification (using the same structure as for objectivity detection)
+    """
+
+
+class FusedSentimentCNN(FusedObjectivityCNN):
+    """
+    This neural network will be used to perform sentiment-polarity classification (using the same structure as for objectivity detection)
+    """
@@ -0,0 +1,138 @@
+from __future__ import absolute_import, annotations
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Optional
+
+import numpy as np
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+
+SCORES_DTYPE: np.dtype = np.dtype([("neg", np.float64), ("neu", np.float64), ("pos", np.float64), ("compound", np.float64)])
+
+_analyzer: Optional[SentimentIntensityAnalyzer] = None  # one analyzer for each process of the pool
+
+
+def _initialize_analyzer() -> None:
+    global _analyzer
+    _analyzer = SentimentIntensityAnalyzer()
+
+
+def _polarity_scores(sentence: str) -> Tuple[float, float, float, float]:
+    scores: dict = _analyzer.polarity_scores(sentence)
+    return scores["neg"], scores["neu"], scores["pos"], scores["compound"]
+
+
+def sentence_hashes(sentences: List[str]) -> np.ndarray:
+    return np.fromiter((int.from_bytes(hashlib.blake2b(sentence.encode("utf-8"), digest_size=8).digest(), "little") for sentence in sentences), dtype=np.uint64, count=len(sentences))
+
+
+def _load_memo(cache_path: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+    if cache_path is None or not os.path.isfile(cache_path):
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=SCORES_DTYPE)
+
+    with np.load(cache_path) as memo:
+        return memo["hashes"], memo["scores"]
+
+
+def _save_memo(cache_path: str, hashes: np.ndarray, scores: np.ndarray) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+    temporary_path: str = f"{cache_path}.tmp.npz"
+    np.savez(temporary_path, hashes=hashes, scores=scores)
+    os.replace(temporary_path, cache_path)  # never leave a truncated memo if the process is interrupted
+
+
+def score_sentences(sentences: List[str], cache_path: Optional[str] = None, processes: Optional[int] = None, chunksize: int = 512) -> np.ndarray:
+    """
+    compute the VADER polarity scores of the sentences, scoring only once the sentences not already in the on-disk memo
+    :param sentences: sentences (or whole texts) to score
+    :param cache_path: `.npz` file where the scores are memoized by sentence hash, nothing is memoized if None
+    :param processes: number of processes used for scoring the new sentences (all the CPUs if None)
+    :param chunksize: number of sentences sent together to a process
+    :return: structured array with `neg`, `neu`, `pos` and `compound` fields, aligned with the sentences
+    """
+    hashes: np.ndarray = sentence_hashes(sentences)
+    unique_hashes, first_indices, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+    memo_hashes, memo_scores = _load_memo(cache_path)
+
+    positions: np.ndarray = np.searchsorted(memo_hashes, unique_hashes)
+    found: np.ndarray = positions < len(memo_hashes)
+    found[found] = memo_hashes[positions[found]] == unique_hashes[found]
+
+    unique_scores: np.ndarray = np.zeros(len(unique_hashes), dtype=SCORES_DTYPE)
+    unique_scores[found] = memo_scores[positions[found]]
+
+    missing: np.ndarray = np.flatnonzero(~found)
+    if len(missing) > 0:
+        missing_sentences: List[str] = [sentences[index] for index in first_indices[missing]]
+        with ProcessPoolExecutor(max_workers=processes, initializer=_initialize_analyzer) as executor:
+            unique_scores[missing] = np.array(list(executor.map(_polarity_scores, missing_sentences, chunksize=chunksize)), dtype=np.float64).view(SCORES_DTYPE).ravel()
+
+        if cache_path is not None:
+            all_hashes: np.ndarray = np.concatenate((memo_hashes, unique_hashes[missing]))
+            order: np.ndarray = np.argsort(all_hashes)
+            _save_memo(cache_path, all_hashes[order], np.concatenate((memo_scores, unique_scores[missing]))[order])
+
+    return unique_scores[inverse.ravel()]
+
+
+def sum_per_review(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    # `bincount` adds the values in sentence order (as the original loops did) and gives 0 to the reviews without sentences
+    offsets = np.asarray(offsets, dtype=np.int64)
+    review_indices: np.ndarray = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    return np.bincount(review_indices, weights=values, minlength=len(offsets) - 1)
+
+
+def subjective_mask(scores: np.ndarray) -> np.ndarray:
+    # a sentence is subjective if its negative or positive score is greater than the neutral one
+    return (scores["neg"] > scores["neu"]) | (scores["pos"] > scores["neu"])
+
+
+def _weights(scores: np.ndarray, subjective_only: bool) -> np.ndarray:
+    return subjective_mask(scores).astype(np.float64) if subjective_only else np.ones(len(scores), dtype=np.float64)
+
+
+def majority_vote(scores: np.ndarray, offsets: np.ndarray, subjective_only: bool = False) -> np.ndarray:
+    """
+    simple count of the sentence labels and take the popular label among the sentences of a review
+    :param scores: sentence scores returned by `score_sentences`
+    :param offsets: offsets of the sentences of each review
+    :param subjective_only: consider only the subjective sentences
+    :return: label of each review (0 for negative, 1 for positive)
+    """
+    weights: np.ndarray = _weights(scores, subjective_only)
+    negative_sentences: np.ndarray = (scores["neg"] > scores["pos"]) * weights
+    negative_counts: np.ndarray = sum_per_review(negative_sentences, offsets)
+    positive_counts: np.ndarray = sum_per_review(weights - negative_sentences, offsets)
+    return np.where(negative_counts > positive_counts, 0, 1)
+
+
+def positive_negative_sum(scores: np.ndarray, offsets: np.ndarray, subjective_only: bool = False) -> np.ndarray:
+    """
+    sum the sentence positive and negative contributions to determine the dominant sentiment of a review
+    :param scores: sentence scores returned by `score_sentences`
+    :param offsets: offsets of the sentences of each review
+    :param subjective_only: consider only the subjective sentences
+    :return: label of each review (0 for negative, 1 for positive)
+    """
+    weights: np.ndarray = _weights(scores, subjective_only)
+    return np.where(sum_per_review(scores["neg"] * weights, offsets) > sum_per_review(scores["pos"] * weights, offsets), 0, 1)
+
+
+def compound_sum(scores: np.ndarray, offsets: np.ndarray, subjective_only: bool = False) -> np.ndarray:
+    """
+    sum the sentence compound scores to determine the sentiment of a review
+    :param scores: sentence scores returned by `score_sentences`
+    :param offsets: offsets of the sentences of each review
+    :param subjective_only: consider only the subjective sentences
+    :return: label of each review (0 for negative, 1 for positive)
+    """
+    weights: np.ndarray = _weights(scores, subjective_only)
+    return np.where(sum_per_review(scores["compound"] * weights, offsets) < 0, 0, 1)
+
+
+def subjective_texts(sentences: List[str], scores: np.ndarray, offsets: np.ndarray) -> List[str]:
+    # join again the subjective sentences of each review, so that the remaining text can be scored as a whole
+    mask: List[bool] = subjective_mask(scores).tolist()
+    return [" ".join([sentences[index] for index in range(start, end) if mask[index]]) for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
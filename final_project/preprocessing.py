@@ -0,0 +1,145 @@
+from __future__ import absolute_import, annotations
+
+import hashlib
+import json
+import os
+import re
+from typing import List, Dict, Iterable, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from vectors import WordVectors
+
+
+PADDING_INDEX: int = 0  # the padding index and the words without a vector share the same all-zeros row of the embedding matrix
+
+
+def clean_review(review: str) -> str:
+    review = review.strip().lower()
+
+    # Remove HTML tags and also the " that can occour in the reviews
+    review = re.sub(r"<.*?>", "", review)
+    review = re.sub(r'"', "", review)
+    return review
+
+
+def build_embedding_store(texts: Iterable[str], vocab: WordVectors, embedding_size: int = 300) -> Tuple[Dict[str, int], np.ndarray]:
+    """
+    map every word of the texts to a row of a single float32 embedding matrix, looking up all the distinct words at once
+    :param texts: texts from which the words are collected (splitting them on whitespaces)
+    :param vocab: `WordVectors` store providing the word vectors
+    :param embedding_size: size of the word vectors
+    :return: mapping from word to row of the embedding matrix and the embedding matrix itself
+    """
+    distinct_words: List[str] = list(dict.fromkeys(word for text in texts for word in text.split()))
+    rows: np.ndarray = vocab.find_rows(distinct_words)
+    found: np.ndarray = rows >= 0
+
+    # the words with a vector take the rows after the padding one in order of first occurrence, the others share the all-zeros padding row (as the original lookup)
+    word_to_index: Dict[str, int] = dict(zip(distinct_words, np.where(found, np.cumsum(found), PADDING_INDEX).tolist()))
+    embedding_matrix: np.ndarray = np.zeros((1 + int(found.sum()), embedding_size), dtype=np.float32)
+    embedding_matrix[1:] = vocab.matrix[rows[found]]
+    return word_to_index, embedding_matrix
+
+
+def fingerprint(texts: Iterable[str], *keys: object) -> str:
+    """
+    hash of the inputs from which the cached arrays (embedding store or sequences) are built
+    :param texts: texts encoded in the arrays
+    :param keys: other inputs (e.g. the embedding size and the fingerprint of the word vectors), serializable with JSON
+    :return: hexadecimal digest
+    """
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")  # so that moving words from a text to the next one changes the hash
+    digest.update(json.dumps(keys).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def is_cached(directory: str, expected_fingerprint: str) -> bool:
+    # the arrays are reused only if they were saved from the same inputs
+    metadata_path: str = os.path.join(directory, "metadata.json")
+    if not os.path.isfile(metadata_path):
+        return False
+
+    with open(metadata_path) as metadata_file:
+        return json.load(metadata_file).get("fingerprint") == expected_fingerprint
+
+
+def _remove_fingerprint(directory: str) -> None:
+    # removed before overwriting the arrays and written again after them, so that an interrupted save is not considered cached
+    os.makedirs(directory, exist_ok=True)
+    metadata_path: str = os.path.join(directory, "metadata.json")
+    if os.path.isfile(metadata_path):
+        os.remove(metadata_path)
+
+
+def _save_fingerprint(directory: str, saved_fingerprint: Optional[str]) -> None:
+    if saved_fingerprint is not None:
+        with open(os.path.join(directory, "metadata.json"), "w") as metadata_file:
+            json.dump({"fingerprint": saved_fingerprint}, metadata_file)
+
+
+def save_embedding_store(directory: str, word_to_index: Dict[str, int], embedding_matrix: np.ndarray, saved_fingerprint: Optional[str] = None) -> None:
+    _remove_fingerprint(directory)
+    with open(os.path.join(directory, "word_to_index.json"), "w", encoding="utf-8") as word_to_index_file:
+        json.dump(word_to_index, word_to_index_file, ensure_ascii=False)
+    np.save(os.path.join(directory, "embedding_matrix.npy"), embedding_matrix)
+    _save_fingerprint(directory, saved_fingerprint)
+
+
+def load_embedding_store(directory: str) -> Tuple[Dict[str, int], np.ndarray]:
+    with open(os.path.join(directory, "word_to_index.json"), encoding="utf-8") as word_to_index_file:
+        word_to_index: Dict[str, int] = json.load(word_to_index_file)
+    return word_to_index, np.load(os.path.join(directory, "embedding_matrix.npy"), mmap_mode="r")
+
+
+def encode_texts(texts: Iterable[str], word_to_index: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    encode the texts as a ragged array of int32 indices into the embedding matrix
+    :param texts: texts to encode (splitting them on whitespaces)
+    :param word_to_index: mapping from word to row of the embedding matrix, unknown words are mapped to the padding index
+    :return: concatenated indices of all the texts and the offsets of each text inside them
+    """
+    indices: List[int] = []
+    offsets: List[int] = [0]
+    for text in texts:
+        indices.extend([word_to_index.get(word, PADDING_INDEX) for word in text.split()])
+        offsets.append(len(indices))
+
+    return np.array(indices, dtype=np.int32), np.array(offsets, dtype=np.int64)
+
+
+def save_sequences(directory: str, indices: np.ndarray, offsets: np.ndarray, saved_fingerprint: Optional[str] = None) -> None:
+    _remove_fingerprint(directory)
+    np.save(os.path.join(directory, "indices.npy"), indices)
+    np.save(os.path.join(directory, "offsets.npy"), offsets)
+    _save_fingerprint(directory, saved_fingerprint)
+
+
+def load_sequences(directory: str) -> Tuple[np.ndarray, np.ndarray]:
+    return np.load(os.path.join(directory, "indices.npy"), mmap_mode="r"), np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+
+
+def pad_sequences(indices: np.ndarray, offsets: np.ndarray, sequence_length: int) -> np.ndarray:
+    """
+    left-pad (or truncate keeping the first words) every sequence of the ragged array to `sequence_length`
+    :param indices: concatenated indices of all the sequences
+    :param offsets: offsets of each sequence inside `indices`
+    :param sequence_length: length of the padded sequences
+    :return: int32 array of shape (number of sequences, sequence_length)
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    starts: np.ndarray = offsets[:-1]
+    lengths: np.ndarray = np.minimum(offsets[1:] - starts, sequence_length)
+
+    # scatter all the kept indices at once: each row gets its words at the end, after the padding
+    rows: np.ndarray = np.repeat(np.arange(len(lengths)), lengths)
+    positions: np.ndarray = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    columns: np.ndarray = positions + np.repeat(sequence_length - lengths, lengths)
+
+    padded_sequences: np.ndarray = np.full((len(lengths), sequence_length), PADDING_INDEX, dtype=np.int32)
+    padded_sequences[rows, columns] = np.asarray(indices)[np.repeat(starts, lengths) + positions]
+    return padded_sequences
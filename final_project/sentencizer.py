@@ -0,0 +1,63 @@
+from __future__ import absolute_import, annotations
+
+import re
+from typing import List, Iterable, Iterator, Pattern, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from spacy import Language
+
+
+# a sentence ends with terminal punctuation marks (possibly followed by closing quotes or brackets) and a whitespace,
+# an ellipsis alone does not end it (as for the spaCy sentencizer, that does not consider "..." a terminal token)
+SENTENCE_END: Pattern = re.compile(r"(?:[.!?]*[!?][.!?]*|(?<!\.)\.)[\"'”’)\]]*(?=\s)")
+
+# words ending with a period that usually do not end a sentence
+ABBREVIATIONS: frozenset = frozenset({"mr.", "mrs.", "ms.", "dr.", "st.", "jr.", "sr.", "vs.", "etc.", "e.g.", "i.e.", "prof.", "mt.", "no."})
+
+
+def spacy_sentencizer() -> Language:
+    """
+    blank English spaCy pipeline with only the rule-based `sentencizer`, the splitter of the experiments (no model is needed)
+    :return: the pipeline, to be passed to `split_sentences` or `objectivity_remotion`
+    """
+    import spacy  # imported only when the spaCy splitter is used
+
+    nlp: Language = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    return nlp
+
+
+class RuleSentencizer:
+    """
+    Opt-in rule-based sentence splitter that approximates the spaCy `sentencizer` without importing spaCy (it gives the same split for about 77% of the IMDB reviews, so it is not used by the experiments)
+    """
+
+    def __init__(self, sentence_end: Pattern = SENTENCE_END, abbreviations: frozenset = ABBREVIATIONS) -> None:
+        self.sentence_end = sentence_end
+        self.abbreviations = abbreviations
+
+    def __call__(self, text: str) -> List[str]:
+        """
+        split a text into sentences
+        :param text: text to split
+        :return: the sentences, without the surrounding whitespaces
+        """
+        sentences: List[str] = []
+        start: int = 0
+        for match in self.sentence_end.finditer(text):
+            word_start: int = max(text.rfind(" ", start, match.start()), text.rfind("\n", start, match.start())) + 1
+            if text[word_start:match.end()].lower() in self.abbreviations:
+                continue
+            sentence: str = text[start:match.end()].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = match.end()
+
+        last_sentence: str = text[start:].strip()
+        if last_sentence:
+            sentences.append(last_sentence)
+        return sentences
+
+    def pipe(self, texts: Iterable[str]) -> Iterator[List[str]]:
+        for text in texts:
+            yield self(text)
@@ -0,0 +1,261 @@
+from __future__ import absolute_import, annotations
+
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Callable, Deque, Optional
+
+import numpy as np
+
+from export import ExportedClassifier
+from filtering import join_subjective_sentences, split_sentences
+from sentencizer import RuleSentencizer, spacy_sentencizer
+
+
+SENTIMENT_LABELS: Dict[int, str] = {0: "negative", 1: "positive"}
+
+
+class ReviewPipeline:
+    """
+    Sentence splitting, objectivity remotion and sentiment classification of a batch of reviews with the exported networks
+    """
+
+    def __init__(self, objectivity_directory: str, sentiment_directory: str, quantized: bool = True, rule_sentencizer: bool = False) -> None:
+        self.objectivity_classifier = ExportedClassifier(objectivity_directory, quantized=quantized)
+        self.sentiment_classifier = ExportedClassifier(sentiment_directory, quantized=quantized)
+        # the same splitter used for training the networks, `RuleSentencizer` is faster but splits some reviews differently
+        self.sentencizer = RuleSentencizer() if rule_sentencizer else spacy_sentencizer()
+
+    def __call__(self, reviews: List[str]) -> List[Dict[str, object]]:
+        sentences, offsets = split_sentences(reviews, self.sentencizer)
+        objectivity: np.ndarray = self.objectivity_classifier.predict(sentences) == 1 if len(sentences) > 0 else np.zeros(0, dtype=bool)
+        subjective_texts: List[str] = join_subjective_sentences(sentences, offsets, objectivity)
+        sentiment_logits: np.ndarray = self.sentiment_classifier.logits(subjective_texts)
+        return [
+            {"sentiment": SENTIMENT_LABELS[int(logits.argmax())], "subjective_text": text, "objective_sentences": int(objectivity[start:end].sum()), "sentences": int(end - start)}
+            for text, logits, start, end in zip(subjective_texts, sentiment_logits, offsets[:-1].tolist(), offsets[1:].tolist())
+        ]
+
+
+class ServerStats:
+    """
+    Counters of the server, the latencies are kept only for the most recent reviews
+    """
+
+    def __init__(self, window: int = 10000) -> None:
+        self.started = time.perf_counter()
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.batch_sizes: Deque[int] = deque(maxlen=window)
+        self.requests = 0
+        self.reviews = 0
+        self.batches = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def summary(self) -> Dict[str, float]:
+        latencies: np.ndarray = 1000 * np.asarray(self.latencies, dtype=np.float64)
+        elapsed: float = time.perf_counter() - self.started
+        return {
+            "requests": self.requests,
+            "reviews": self.reviews,
+            "batches": self.batches,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "mean batch size": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+            "p50 latency ms": float(np.percentile(latencies, 50)) if len(latencies) > 0 else 0.0,
+            "p99 latency ms": float(np.percentile(latencies, 99)) if len(latencies) > 0 else 0.0,
+            "reviews per second": self.reviews / elapsed if elapsed > 0 else 0.0
+        }
+
+
+class MicroBatcher:
+    """
+    Collect the reviews of concurrent requests into micro-batches processed by a single worker thread
+    """
+
+    def __init__(self, process_batch: Callable[[List[str]], List[Dict[str, object]]], max_batch_size: int = 64, max_wait: float = 0.005, queue_size: int = 1024) -> None:
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue: Optional[asyncio.Queue] = None
+        self.queue_size = queue_size
+        self.stats = ServerStats()
+        # a single thread runs the batches, so the event loop keeps accepting requests while the networks are running
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def start(self) -> asyncio.Task:
+        # the queue is created inside the running event loop
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        return asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Tuple[str, float, asyncio.Future]] = [await self.queue.get()]
+            deadline: float = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout: float = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            reviews: List[str] = [review for review, _, _ in batch]
+            try:
+                results: List[Dict[str, object]] = await loop.run_in_executor(self.executor, self.process_batch, reviews)
+            except Exception as error:  # the whole batch fails, but the server keeps running
+                self.stats.errors += len(batch)
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+
+            finished: float = time.perf_counter()
+            self.stats.batches += 1
+            self.stats.batch_sizes.append(len(batch))
+            for (_, enqueued, future), result in zip(batch, results):
+                self.stats.reviews += 1
+                self.stats.latencies.append(finished - enqueued)
+                if not future.done():
+                    future.set_result(result)
+
+    def submit(self, reviews: List[str]) -> List[asyncio.Future]:
+        """
+        enqueue the reviews of a request without waiting
+        :param reviews: reviews to classify
+        :return: one future for each review
+        :raise asyncio.QueueFull: if the queue has no room for all the reviews (backpressure)
+        """
+        if self.queue.maxsize - self.queue.qsize() < len(reviews):
+            raise asyncio.QueueFull
+        loop = asyncio.get_running_loop()
+        futures: List[asyncio.Future] = []
+        for review in reviews:
+            future: asyncio.Future = loop.create_future()
+            self.queue.put_nowait((review, time.perf_counter(), future))
+            futures.append(future)
+        return futures
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    request_line: bytes = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    headers: Dict[str, str] = {}
+    while True:
+        line: bytes = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, value = line.decode("latin-1").split(":", 1)
+        headers[name.strip().lower()] = value.strip()
+    body: bytes = await reader.readexactly(int(headers.get("content-length", 0)))
+    return method, path, headers, body
+
+
+def _response(status: str, payload: object, keep_alive: bool) -> bytes:
+    body: bytes = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    headers: str = f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    return headers.encode("latin-1") + body
+
+
+class ReviewServer:
+    """
+    Minimal HTTP/1.1 server (on TCP or on a Unix socket) exposing `POST /predict` and `GET /stats`
+    """
+
+    def __init__(self, batcher: MicroBatcher) -> None:
+        self.batcher = batcher
+
+    async def _predict(self, body: bytes) -> Tuple[str, object]:
+        try:
+            payload: Dict[str, object] = json.loads(body)
+            reviews: List[str] = payload["reviews"] if "reviews" in payload else [payload["review"]]
+            # a string is iterable as well, so `reviews` must be a list, otherwise each of its characters would be a review
+            if not isinstance(reviews, list) or not all(isinstance(review, str) for review in reviews):
+                raise ValueError
+        except (ValueError, KeyError, TypeError):
+            return "400 Bad Request", {"error": "expected a JSON object with a `review` string or a `reviews` list of strings"}
+
+        self.batcher.stats.requests += 1
+        if len(reviews) > self.batcher.queue_size:  # it could never fit in the queue, retrying would not help
+            self.batcher.stats.rejected += 1
+            return "413 Payload Too Large", {"error": f"too many reviews in a request ({len(reviews)}), at most {self.batcher.queue_size} are accepted"}
+
+        try:
+            futures: List[asyncio.Future] = self.batcher.submit(reviews)
+        except asyncio.QueueFull:
+            self.batcher.stats.rejected += 1
+            return "503 Service Unavailable", {"error": "too many pending reviews, retry later"}
+
+        try:
+            return "200 OK", {"predictions": list(await asyncio.gather(*futures))}
+        except Exception as error:
+            return "500 Internal Server Error", {"error": str(error)}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:  # keep the connection open for the following requests of the same client
+                request: Optional[Tuple[str, str, Dict[str, str], bytes]] = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive: bool = headers.get("connection", "keep-alive").lower() != "close"
+                if method == "POST" and path == "/predict":
+                    status, payload = await self._predict(body)
+                elif method == "GET" and path == "/stats":
+                    status, payload = "200 OK", self.batcher.stats.summary()
+                else:
+                    status, payload = "404 Not Found", {"error": f"unknown endpoint {method} {path}"}
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080, unix_socket: Optional[str] = None) -> None:
+        batching_task: asyncio.Task = self.batcher.start()
+        if unix_socket is not None:
+            server = await asyncio.start_unix_server(self.handle, path=unix_socket)
+        else:
+            server = await asyncio.start_server(self.handle, host=host, port=port)
+        print(f"serving on {unix_socket if unix_socket is not None else f'http://{host}:{port}'}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batching_task.cancel()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the objectivity remotion and the sentiment classification of reviews with micro-batching")
+    parser.add_argument("objectivity", help="directory of the exported objectivity network")
+    parser.add_argument("sentiment", help="directory of the exported sentiment network")
+    parser.add_argument("--host", default="127.0.0.1", help="host of the HTTP server")
+    parser.add_argument("--port", type=int, default=8080, help="port of the HTTP server")
+    parser.add_argument("--unix-socket", default=None, help="serve on this Unix socket instead of TCP")
+    parser.add_argument("--max-batch-size", type=int, default=64, help="maximum number of reviews of a micro-batch")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="maximum time waited for filling a micro-batch")
+    parser.add_argument("--queue-size", type=int, default=1024, help="maximum number of pending reviews, the following requests are rejected with 503")
+    parser.add_argument("--fp32", action="store_true", help="use the traced fp32 networks instead of the quantized ones")
+    parser.add_argument("--rule-sentencizer", action="store_true", help="split the sentences with `RuleSentencizer` instead of the spaCy sentencizer used for training (faster, but it splits some reviews differently)")
+    arguments = parser.parse_args()
+
+    pipeline: ReviewPipeline = ReviewPipeline(arguments.objectivity, arguments.sentiment, quantized=not arguments.fp32, rule_sentencizer=arguments.rule_sentencizer)
+    batcher: MicroBatcher = MicroBatcher(pipeline, max_batch_size=arguments.max_batch_size, max_wait=arguments.max_wait_ms / 1000, queue_size=arguments.queue_size)
+    try:
+        asyncio.run(ReviewServer(batcher).serve(arguments.host, arguments.port, arguments.unix_socket))
+    except KeyboardInterrupt:
+        print(json.dumps(batcher.stats.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+from __future__ import absolute_import, annotations
+
+import os
+import sys
+import time
+from typing import Dict, Optional, Tuple
+
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader
+
+from metrics import ConfusionMatrix
+from models import ObjectivityNetwork
+# the tracing library is shared by all the projects, it is in the root of the repository
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tracing import span
+
+
+def set_threads(device: torch.device, threads: Optional[int] = None) -> None:
+    """
+    set explicitly the number of intra-op threads used by PyTorch on CPU, instead of relying on its default
+    :param device: device where the model is, nothing is done for the GPUs
+    :param threads: number of threads, all the available cores if not given
+    """
+    if device.type == "cpu":
+        torch.set_num_threads(threads if threads is not None else os.cpu_count() or 1)
+
+
+def synchronize(device: torch.device) -> None:
+    """
+    wait for the kernels queued on a GPU, so that a span ends when its work is done and not when it is only queued
+    :param device: device where the model is, nothing is done for the CPU
+    """
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+
+class HiddenStates:
+    """
+    Zero initial hidden states of a bidirectional GRU network, a single buffer is allocated for each batch size
+    """
+
+    def __init__(self, model: ObjectivityNetwork, device: torch.device) -> None:
+        self.layers = 2 * model.layers_number
+        self.hidden_dimension = model.hidden_dimension
+        self.device = device
+        self._buffers: Dict[int, torch.tensor] = {}
+
+    def __call__(self, batch_size: int) -> torch.tensor:
+        # the GRU does not write into its initial hidden state, so every batch of a size starts from the same zeros and nothing is carried between batches
+        if batch_size not in self._buffers:
+            with torch.inference_mode(False):  # a buffer allocated during the evaluation can be used also for training
+                self._buffers[batch_size] = torch.zeros((self.layers, batch_size, self.hidden_dimension), device=self.device)
+        return self._buffers[batch_size]
+
+
+class Engine:
+    """
+    Shared training and evaluation loops of the GRU networks (`ObjectivityNetwork` and `SentimentNetwork`), reporting the samples per second of each epoch
+    """
+
+    def __init__(self, model: ObjectivityNetwork, device: torch.device, criterion: Optional[nn.Module] = None, threads: Optional[int] = None) -> None:
+        self.model = model
+        self.device = device
+        self.criterion = criterion if criterion is not None else nn.CrossEntropyLoss()
+        self.hidden_states = HiddenStates(model, device)
+        set_threads(device, threads)
+
+    def _run_epoch(self, loader: DataLoader, stage: str, optimizer: Optional[torch.optim.Optimizer] = None) -> Tuple[ConfusionMatrix, float]:
+        metrics = ConfusionMatrix(device=self.device)
+        samples: int = 0
+        start: float = time.perf_counter()
+        with span(f"{type(self.model).__name__} {stage}") as epoch_span:
+            for x, lengths, y in loader:
+                x, y = x.to(self.device), y.to(self.device)
+                outputs, _ = self.model(x, lengths, self.hidden_states(x.size(0)))
+                loss = self.criterion(outputs, y.long())
+                _, predicted = outputs.max(1)
+                metrics.update(predicted, y, loss)
+
+                if optimizer is not None:
+                    optimizer.zero_grad()
+                    loss.backward()
+                    optimizer.step()
+                samples += x.size(0)
+                epoch_span.count(batches=1, samples=x.size(0))
+            synchronize(self.device)
+
+        elapsed: float = time.perf_counter() - start
+        return metrics, samples / elapsed if elapsed > 0 else 0.0
+
+    def train_epoch(self, loader: DataLoader, optimizer: torch.optim.Optimizer) -> Tuple[ConfusionMatrix, float]:
+        """
+        train the model for an epoch
+        :param loader: loader of the (padded sequences, lengths, labels) batches
+        :param optimizer: optimizer of the parameters of the model
+        :return: the metrics of the epoch and the samples per second
+        """
+        self.model.train()
+        return self._run_epoch(loader, "training epoch", optimizer)
+
+    def evaluate(self, loader: DataLoader) -> Tuple[ConfusionMatrix, float]:
+        """
+        evaluate the model without building the autograd graphs
+        :param loader: loader of the (padded sequences, lengths, labels) batches
+        :return: the metrics and the samples per second
+        """
+        self.model.eval()
+        with torch.inference_mode():
+            return self._run_epoch(loader, "evaluation")
+
+    def fit(self, train_loader: DataLoader, optimizer: torch.optim.Optimizer, epochs: int = 5, test_loader: Optional[DataLoader] = None, checkpoint: Optional[str] = None) -> float:
+        """
+        train the model printing the metrics of each epoch, evaluating it after each epoch if a test loader is given
+        :param train_loader: loader of the training batches
+        :param optimizer: optimizer of the parameters of the model
+        :param epochs: number of epochs
+        :param test_loader: loader of the test batches
+        :param checkpoint: path where the state dict is saved when the test f1 score does not decrease
+        :return: the best test f1 score (the last training one without a test loader)
+        """
+        f1_score_max: float = 0.0
+        for epoch in range(epochs):
+            if test_loader is not None:
+                print(f"Epoch {epoch + 1}")
+            metrics, samples_per_second = self.train_epoch(train_loader, optimizer)
+            print(f"{metrics.summary('train ' if test_loader is not None else '')}, {samples_per_second:.1f} samples/s")
+            if test_loader is None:
+                f1_score_max = metrics.f1_score()
+                continue
+
+            metrics, samples_per_second = self.evaluate(test_loader)
+            overall_f1_score: float = metrics.f1_score()
+            print(f"{metrics.summary('test ')}, {samples_per_second:.1f} samples/s")
+            if overall_f1_score >= f1_score_max:
+                print(f"Increase in f1 score from {f1_score_max} to {overall_f1_score}")
+                if checkpoint is not None:
+                    torch.save(self.model.state_dict(), checkpoint)
+                f1_score_max = overall_f1_score
+            print(10 * "================")
+        return f1_score_max
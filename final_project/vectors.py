@@ -0,0 +1,105 @@
+from __future__ import absolute_import, annotations
+
+import hashlib
+import os
+from typing import List, Iterable, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from spacy.vocab import Vocab
+
+
+def word_hashes(words: Iterable[str]) -> np.ndarray:
+    # 64-bit hashes of the words, computed without spaCy so that the store can be used without loading it
+    return np.fromiter((int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little") for word in words), dtype=np.uint64)
+
+
+class WordVectors:
+    """
+    Read-only store of word vectors: a float32 matrix and a table from word hash to row, both memory-mapped when loaded from disk
+    """
+
+    def __init__(self, matrix: np.ndarray, hashes: np.ndarray, rows: np.ndarray) -> None:
+        if len(hashes) != len(rows):
+            raise ValueError(f"Size Mismatch: hashes: {len(hashes)} & rows: {len(rows)}")
+
+        self.matrix = matrix
+        self.hashes = hashes  # sorted, so that the rows of the words are found with a binary search
+        self.rows = rows
+
+    @classmethod
+    def from_spacy(cls, vocab: Vocab) -> WordVectors:
+        """
+        copy the vectors of a spaCy vocab (e.g. the one of `en_core_web_lg`) into a store
+        :param vocab: spaCy vocab with vectors
+        :return: the store with all the words of the vocab that have a vector
+        """
+        words: List[str] = []
+        rows: List[int] = []
+        for key, row in vocab.vectors.key2row.items():
+            if key in vocab.strings:  # the string of a hash is not always available
+                words.append(vocab.strings[key])
+                rows.append(row)
+
+        hashes: np.ndarray = word_hashes(words)
+        order: np.ndarray = np.argsort(hashes)
+        return cls(np.asarray(vocab.vectors.data, dtype=np.float32), hashes[order], np.array(rows, dtype=np.int64)[order])
+
+    @classmethod
+    def load(cls, directory: str) -> WordVectors:
+        # the memory-mapped arrays are shared through the page cache by all the processes (and DataLoader workers) that load them
+        return cls(*(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in ("matrix", "hashes", "rows")))
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        for name, array in (("matrix", self.matrix), ("hashes", self.hashes), ("rows", self.rows)):
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    @property
+    def embedding_size(self) -> int:
+        return self.matrix.shape[1]
+
+    def find_rows(self, words: List[str]) -> np.ndarray:
+        """
+        find the rows of the vectors of many words at once
+        :param words: words to look up
+        :return: row of each word in the matrix, -1 for the words without a vector
+        """
+        hashes: np.ndarray = word_hashes(words)
+        positions: np.ndarray = np.minimum(np.searchsorted(self.hashes, hashes), max(len(self.hashes) - 1, 0))
+        found: np.ndarray = np.asarray(self.hashes[positions] == hashes) if len(self.hashes) > 0 else np.zeros(len(words), dtype=bool)
+        return np.where(found, np.asarray(self.rows)[positions], -1)
+
+    def fingerprint(self) -> str:
+        # the hashes and rows of the words, the shape of the matrix and a strided sample of its rows, without reading the whole matrix
+        digest = hashlib.sha256()
+        for array in (self.hashes, self.rows, np.array(self.matrix.shape, dtype=np.int64), self.matrix[::1000]):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def has_vector(self, word: str) -> bool:
+        return bool(self.find_rows([word])[0] >= 0)
+
+    def get_vector(self, word: str) -> np.ndarray:
+        # same behaviour of the spaCy vocab: the words without a vector get an all-zeros vector
+        row: int = int(self.find_rows([word])[0])
+        return np.asarray(self.matrix[row]) if row >= 0 else np.zeros(self.embedding_size, dtype=np.float32)
+
+
+def load_word_vectors(directory: str, model_name: str = "en_core_web_lg") -> WordVectors:
+    """
+    load the store of word vectors, exporting it once from the spaCy model if it is not in the directory
+    :param directory: directory of the store
+    :param model_name: spaCy model providing the vectors (loaded only the first time)
+    :return: the memory-mapped store
+    """
+    if not os.path.isfile(os.path.join(directory, "hashes.npy")):
+        import spacy  # spaCy and its model are needed only for the export
+
+        nlp = spacy.load(model_name, exclude=["tagger", "parser", "attribute_ruler", "lemmatizer", "ner"])
+        WordVectors.from_spacy(nlp.vocab).save(directory)
+    return WordVectors.load(directory)
@@ -0,0 +1,131 @@
+from __future__ import absolute_import, annotations
+
+import unicodedata
+from typing import List, Dict, Tuple, Optional, Sequence
+
+from nltk.parse import DependencyGraph
+import numpy as np
+
+from treebank import Treebank
+
+
+# unicode categories of the punctuation, the tokens made only of these characters are excluded as in the NLTK DependencyEvaluator
+PUNCTUATION_CATEGORIES: frozenset = frozenset({"Pc", "Pd", "Ps", "Pe", "Pi", "Pf", "Po"})
+
+
+def is_punctuation(word: str) -> bool:
+    return all(unicodedata.category(character) in PUNCTUATION_CATEGORIES for character in word)
+
+
+def depgraphs_to_arrays(depgraphs: Sequence[DependencyGraph], word_vocabulary: Dict[str, int], relation_vocabulary: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    concatenate the tokens of many dependency graphs into arrays of ids, in a single pass over their nodes
+    :param depgraphs: parsed or gold sentences
+    :param word_vocabulary: ids of the words, extended with the new ones (shared by the parsed and the gold sentences)
+    :param relation_vocabulary: ids of the relations, extended with the new ones
+    :return: word ids, heads and relation ids of the tokens and offsets of the sentences
+    """
+    words: List[int] = []
+    heads: List[int] = []
+    relations: List[int] = []
+    offsets: List[int] = [0]
+    for depgraph in depgraphs:
+        nodes: dict = depgraph.nodes
+        for address in sorted(nodes):
+            node: dict = nodes[address]
+            if node["word"] is None:  # the TOP node
+                continue
+            words.append(word_vocabulary.setdefault(node["word"], len(word_vocabulary)))
+            heads.append(node["head"] if node["head"] is not None else -1)
+            relations.append(relation_vocabulary.setdefault(node["rel"] or "", len(relation_vocabulary)))
+        offsets.append(len(words))
+    return np.array(words, dtype=np.int64), np.array(heads, dtype=np.int64), np.array(relations, dtype=np.int64), np.array(offsets, dtype=np.int64)
+
+
+def punctuation_mask(word_vocabulary: Dict[str, int]) -> np.ndarray:
+    # the punctuation check is done once for each distinct word, the mask of the tokens is indexed by their word ids
+    return np.array([is_punctuation(word) for word in word_vocabulary], dtype=bool)
+
+
+def attachment_scores(gold_heads: np.ndarray, gold_relations: np.ndarray, parsed_heads: np.ndarray, parsed_relations: np.ndarray, punctuation: Optional[np.ndarray] = None,
+                      relation_names: Optional[List[str]] = None) -> Dict[str, object]:
+    """
+    compute the attachment scores of the concatenated tokens of many sentences
+    :param gold_heads: gold head of each token
+    :param gold_relations: gold relation of each token (strings or ids)
+    :param parsed_heads: predicted head of each token
+    :param parsed_relations: predicted relation of each token
+    :param punctuation: mask of the punctuation tokens, if given the scores excluding them are also computed
+    :param relation_names: names of the relation ids, used as keys of the scores of each relation
+    :return: UAS and LAS over all the tokens (and without punctuation) and the scores for each gold relation
+    """
+    if not len(gold_heads) == len(gold_relations) == len(parsed_heads) == len(parsed_relations):
+        raise ValueError(f"Size Mismatch: gold heads: {len(gold_heads)} & gold relations: {len(gold_relations)} & parsed heads: {len(parsed_heads)} & parsed relations: {len(parsed_relations)}")
+    if punctuation is not None and len(punctuation) != len(gold_heads):
+        raise ValueError(f"Size Mismatch: tokens: {len(gold_heads)} & punctuation: {len(punctuation)}")
+
+    correct_heads: np.ndarray = np.asarray(gold_heads) == np.asarray(parsed_heads)
+    correct_labels: np.ndarray = correct_heads & (np.asarray(gold_relations) == np.asarray(parsed_relations))
+    tokens: int = len(correct_heads)
+    scores: Dict[str, object] = {
+        "tokens": tokens,
+        "uas": float(correct_heads.mean()) if tokens else 0.0,
+        "las": float(correct_labels.mean()) if tokens else 0.0,
+    }
+    if punctuation is not None:
+        words: np.ndarray = ~np.asarray(punctuation, dtype=bool)
+        scores["tokens_without_punctuation"] = int(words.sum())
+        scores["uas_without_punctuation"] = float(correct_heads[words].mean()) if words.any() else 0.0
+        scores["las_without_punctuation"] = float(correct_labels[words].mean()) if words.any() else 0.0
+
+    # the counts of each gold relation are accumulated with a single bincount over the relation of each token
+    relations, relation_ids = np.unique(np.asarray(gold_relations), return_inverse=True)
+    relation_keys: List[object] = [relation_names[relation] for relation in relations.tolist()] if relation_names is not None else relations.tolist()
+    relation_tokens: np.ndarray = np.bincount(relation_ids, minlength=len(relations))
+    relation_heads: np.ndarray = np.bincount(relation_ids, weights=correct_heads, minlength=len(relations))
+    relation_labels: np.ndarray = np.bincount(relation_ids, weights=correct_labels, minlength=len(relations))
+    scores["relations"] = {
+        relation: {"tokens": int(count), "uas": heads / count, "las": labels / count}
+        for relation, count, heads, labels in zip(relation_keys, relation_tokens.tolist(), relation_heads.tolist(), relation_labels.tolist())
+    }
+    return scores
+
+
+def evaluate_depgraphs(parsed_sents: Sequence[DependencyGraph], gold_sents: Sequence[DependencyGraph]) -> Dict[str, object]:
+    """
+    compute the attachment scores of the parsed sentences against the gold ones
+    :param parsed_sents: sentences parsed by the parser
+    :param gold_sents: gold sentences, in the same order
+    :return: the scores of `attachment_scores`, the ones without punctuation are the same of the NLTK DependencyEvaluator
+    """
+    if len(parsed_sents) != len(gold_sents):
+        raise ValueError(f"Size Mismatch: parsed sentences: {len(parsed_sents)} & gold sentences: {len(gold_sents)}")
+
+    word_vocabulary: Dict[str, int] = {}
+    relation_vocabulary: Dict[str, int] = {}
+    gold_words, gold_heads, gold_relations, gold_offsets = depgraphs_to_arrays(gold_sents, word_vocabulary, relation_vocabulary)
+    parsed_words, parsed_heads, parsed_relations, parsed_offsets = depgraphs_to_arrays(parsed_sents, word_vocabulary, relation_vocabulary)
+    if not np.array_equal(parsed_offsets, gold_offsets) or not np.array_equal(parsed_words, gold_words):
+        raise ValueError("Token Mismatch: the parsed sentences do not have the same tokens of the gold ones")
+    return attachment_scores(gold_heads, gold_relations, parsed_heads, parsed_relations, punctuation_mask(word_vocabulary)[gold_words], list(relation_vocabulary))
+
+
+def evaluate_treebank(parsed_sents: Sequence[DependencyGraph], gold_sents: Treebank) -> Dict[str, object]:
+    """
+    compute the attachment scores of the parsed sentences against a slice of the cached treebank, without building its graphs
+    :param parsed_sents: sentences parsed by the parser
+    :param gold_sents: the same sentences in the treebank (e.g. `treebank[-10:]`)
+    :return: the scores of `attachment_scores`
+    """
+    if len(parsed_sents) != len(gold_sents):
+        raise ValueError(f"Size Mismatch: parsed sentences: {len(parsed_sents)} & gold sentences: {len(gold_sents)}")
+
+    # the vocabularies of the treebank are extended with the relations (and words) that only the parser produces
+    word_vocabulary: Dict[str, int] = {word: index for index, word in enumerate(gold_sents.word_vocabulary)}
+    relation_vocabulary: Dict[str, int] = {relation: index for index, relation in enumerate(gold_sents.relation_vocabulary)}
+    parsed_words, parsed_heads, parsed_relations, _ = depgraphs_to_arrays(parsed_sents, word_vocabulary, relation_vocabulary)
+    positions: np.ndarray = gold_sents.token_positions()
+    gold_words: np.ndarray = gold_sents.words[positions]
+    if not np.array_equal(parsed_words, gold_words):
+        raise ValueError("Token Mismatch: the parsed sentences do not have the same tokens of the gold ones")
+    return attachment_scores(gold_sents.heads[positions], gold_sents.relations[positions], parsed_heads, parsed_relations, punctuation_mask(word_vocabulary)[gold_words], list(relation_vocabulary))
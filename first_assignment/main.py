@@ -1,17 +1,27 @@
 from __future__ import absolute_import, annotations
 
-from typing import List, Dict, Union
+from itertools import islice
+import os
+import sys
+import time
+from typing import List, Dict, Union, Iterable, Iterator, Tuple, Callable
 
-import nltk
-nltk.download("dependency_treebank")
-from nltk.corpus import dependency_treebank
 from nltk.parse.transitionparser import *
 from nltk.tokenize.treebank import TreebankWordDetokenizer
+import numpy as np
 from sklearn.ensemble import GradientBoostingClassifier
 import spacy
 from spacy import Language
+from spacy.attrs import HEAD, DEP, SENT_START, IDX, LENGTH
 from spacy.tokens import Token, Doc, Span
 
+from evaluation import evaluate_treebank
+from perceptron import AveragedPerceptron
+# the tracing library is shared by all the projects, it is in the root of the repository
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tracing import span, write_trace
+from treebank import Treebank, load_treebank
+
 
 spacy_nlp: Language = spacy.load("en_core_web_sm")
 
@@ -124,6 +134,62 @@ def extract_subj_dobj_iobj(sentence: str) -> Dict[str, List[str]]:
     return subj_dobj_iobj
 
 
+SUBJ_DOBJ_IOBJ_DEPENDENCY_RELATIONS: Dict[str, str] = {"nsubj": "subj", "nsubjpass": "subj", "csubj": "subj", "csubjpass": "subj", "expl": "subj", "dobj": "dobj", "dative": "iobj"}
+
+
+# 5. (batch version) extract subject, direct object and indirect object spans of every sentence of many texts
+def extract_subj_dobj_iobj_batch(texts: Iterable[str], batch_size: int = 1000, n_process: int = 1) -> Iterator[List[Dict[str, List[Tuple[int, int]]]]]:
+    if isinstance(texts, str):
+        raise TypeError("You pass a `texts` parameter of a wrong type")
+
+    # the named entities are not needed, only the dependency parse is used: NER is disabled only for this `pipe` call and not on the shared
+    # pipeline, that would otherwise run without it also in the code executed while this generator is suspended
+    docs: Iterator[Doc] = iter(spacy_nlp.pipe(texts, batch_size=batch_size, n_process=n_process, disable=["ner"]))
+    while True:
+        docs_batch: List[Doc] = list(islice(docs, batch_size))
+        if not docs_batch:
+            break
+        yield from subj_dobj_iobj_offsets(docs_batch)
+
+
+def subj_dobj_iobj_offsets(docs: List[Doc]) -> List[List[Dict[str, List[Tuple[int, int]]]]]:
+    # all the tokens of the docs are handled together as NumPy arrays, Python objects are created only for the spans found
+    arrays: np.ndarray = np.concatenate([doc.to_array([HEAD, DEP, SENT_START, IDX, LENGTH]).reshape(-1, 5) for doc in docs] + [np.zeros((0, 5), dtype=np.uint64)])
+    deps: np.ndarray = arrays[:, 1]  # the dependency relations are uint64 hashes, the other attributes are small integers (negative ones are stored wrapped)
+    arrays = arrays.astype(np.int64)
+    positions: np.ndarray = np.arange(len(arrays))
+    heads: np.ndarray = positions + arrays[:, 0]
+    doc_offsets: np.ndarray = np.cumsum([0] + [len(doc) for doc in docs])
+    sentence_starts: np.ndarray = arrays[:, 2] == 1
+    sentence_starts[doc_offsets[:-1][np.diff(doc_offsets) > 0]] = True  # the first token of every doc starts a sentence
+    sentence_ids: np.ndarray = np.cumsum(sentence_starts) - 1
+
+    # left and right edges of the subtree of every token, propagated from the tokens to their heads one level at a time
+    left_edges: np.ndarray = positions.copy()
+    right_edges: np.ndarray = positions.copy()
+    while True:
+        previous_left_edges, previous_right_edges = left_edges.copy(), right_edges.copy()
+        np.minimum.at(left_edges, heads, left_edges)
+        np.maximum.at(right_edges, heads, right_edges)
+        if np.array_equal(left_edges, previous_left_edges) and np.array_equal(right_edges, previous_right_edges):
+            break
+
+    # the children of a sentence ROOT (the token that is its own head) with one of the searched dependency relations
+    dependency_relation_ids: Dict[int, str] = {spacy_nlp.vocab.strings.add(dependency_relation): key for dependency_relation, key in SUBJ_DOBJ_IOBJ_DEPENDENCY_RELATIONS.items()}
+    is_root: np.ndarray = heads == positions
+    children: np.ndarray = np.flatnonzero(~is_root & is_root[heads] & np.isin(deps, np.array(list(dependency_relation_ids), dtype=np.uint64)))
+
+    first_sentence_ids: List[int] = np.append(sentence_ids, sentence_ids[-1] + 1 if len(sentence_ids) > 0 else 0)[doc_offsets].tolist()
+    batch_offsets: List[List[Dict[str, List[Tuple[int, int]]]]] = [
+        [{"subj": [], "dobj": [], "iobj": []} for _ in range(sentences_number)] for sentences_number in np.diff(first_sentence_ids).tolist()
+    ]
+    doc_indices: np.ndarray = np.searchsorted(doc_offsets, children, side="right") - 1
+    for doc_index, sentence_id, dependency_relation, start, end in zip(doc_indices.tolist(), sentence_ids[children].tolist(), deps[children].tolist(), arrays[left_edges[children], 3].tolist(), (arrays[right_edges[children], 3] + arrays[right_edges[children], 4]).tolist()):
+        batch_offsets[doc_index][sentence_id - first_sentence_ids[doc_index]][dependency_relation_ids[dependency_relation]].append((start, end))
+
+    return batch_offsets  # for every doc a list with a dict for each sentence, containing the character offsets of the subject, direct object and indirect object spans
+
+
 if __name__ == "__main__":
 
     example_sentence: str = "I saw a man with a telescope, he was looking at the Moon."
@@ -163,6 +229,11 @@ if __name__ == "__main__":
     print(extract_subj_dobj_iobj(example_sentence))
     print()
 
+    print("5. (batch version) extract subject, direct object and indirect object spans of every sentence of many texts:")
+    for text, text_offsets in zip([example_sentence], extract_subj_dobj_iobj_batch([example_sentence])):
+        print([{key: [text[start:end] for start, end in spans] for key, spans in sentence_offsets.items()} for sentence_offsets in text_offsets])
+    print()
+
     # Training Transition-Based Dependency Parser (Optional & Advanced)
 
     # Modify NLTK Transition parser ' s Configuration class to use better features
@@ -301,8 +372,55 @@ if __name__ == "__main__":
             return result
 
 
+    # classifiers that can be used by MyTransitionParser to predict the transitions, built from the verbose flag
+    TRANSITION_CLASSIFIERS: Dict[str, Callable[[bool], object]] = {
+        # the parameters of the SVM are the ones of the NLTK TransitionParser
+        "svm": lambda verbose: svm.SVC(kernel="poly", degree=2, coef0=0, gamma=0.2, C=0.5, verbose=verbose, probability=True),
+        "gbc": lambda verbose: GradientBoostingClassifier(loss="log_loss", learning_rate=0.1, verbose=verbose),
+        "perceptron": lambda verbose: AveragedPerceptron(epochs=10, verbose=verbose),
+    }
+
+
     class MyTransitionParser(TransitionParser):
 
+        def __init__(self, algorithm, classifier="svm"):
+            if classifier not in TRANSITION_CLASSIFIERS:
+                raise ValueError(f"Unknown Classifier: {classifier}")
+
+            super().__init__(algorithm)
+            self._classifier = classifier
+
+        def train(self, depgraphs, modelfile, verbose=True):
+            try:
+                input_file = tempfile.NamedTemporaryFile(
+                    prefix="transition_parse.train", dir=tempfile.gettempdir(), delete=False
+                )
+
+                with span("oracle generation", sentences=len(depgraphs)) as oracle_span:
+                    if self._algorithm == self.ARC_STANDARD:
+                        training_seq = self._create_training_examples_arc_std(depgraphs, input_file)
+                    else:
+                        training_seq = self._create_training_examples_arc_eager(depgraphs, input_file)
+                    oracle_span.count(transitions=len(training_seq))
+
+                input_file.close()
+                model = TRANSITION_CLASSIFIERS[self._classifier](verbose)
+                with span(f"{self._classifier} training", transitions=len(training_seq)):
+                    if isinstance(model, AveragedPerceptron):
+                        # the perceptron learns one transition at a time, streaming the examples from the file at each epoch
+                        model.fit_file(input_file.name)
+                    else:
+                        # Using the temporary file to train the scikit-learn classifier
+                        x_train, y_train = load_svmlight_file(input_file.name)
+                        # recent scikit-learn versions load the indices as int64, while libsvm (behind the SVM) accepts only int32 ones, the same conversion of NLTK
+                        x_train.indices = x_train.indices.astype("int32", copy=False)
+                        x_train.indptr = x_train.indptr.astype("int32", copy=False)
+                        model.fit(x_train, y_train)
+                # Save the model to file name (as pickle)
+                pickle.dump(model, open(modelfile, "wb"))
+            finally:
+                remove(input_file.name)
+
         def _create_training_examples_arc_std(self, depgraphs, input_file):
             operation = Transition(self.ARC_STANDARD)
             count_proj = 0
@@ -422,6 +540,10 @@ if __name__ == "__main__":
             return training_seq
 
         def parse(self, depgraphs, modelFile):
+            with span(f"{self._classifier} parsing", sentences=len(depgraphs)):
+                return self._parse_with_classifier(depgraphs, modelFile)
+
+        def _parse_with_classifier(self, depgraphs, modelFile):
             result = []
             # First load the model
             model = pickle.load(open(modelFile, "rb"))
@@ -503,54 +625,64 @@ if __name__ == "__main__":
             return result
 
     # Evaluate the features comparing performance to the original
+    with span("treebank loading"):
+        treebank: Treebank = load_treebank("cache/dependency_treebank")  # the corpus is parsed only the first time, then read from the cached arrays
     transition_parser = TransitionParser("arc-standard")
-    transition_parser.train(dependency_treebank.parsed_sents()[:100], "transition_parser.model")
-    parses = transition_parser.parse(dependency_treebank.parsed_sents()[-10:], "transition_parser.model")
+    with span("NLTK training", sentences=100):
+        transition_parser.train(treebank[:100], "transition_parser.model")
+    with span("NLTK parsing", sentences=10):
+        parses = transition_parser.parse(treebank[-10:], "transition_parser.model")
     print(len(parses))
-    dependency_evaluator = DependencyEvaluator(parses, dependency_treebank.parsed_sents()[-10:])
+    dependency_evaluator = DependencyEvaluator(parses, treebank[-10:])
     print(f"The scores of the standard TransitionParser are: {dependency_evaluator.eval()}")
     print()
 
+    # the training times and the parses of each classifier, reused by the comparison below
+    training_times: Dict[str, float] = {}
+    classifier_parses: Dict[str, list] = {}
+
     my_transition_parser = MyTransitionParser("arc-standard")
-    my_transition_parser.train(dependency_treebank.parsed_sents()[:100], "my_transition_parser.model")
-    parses = my_transition_parser.parse(dependency_treebank.parsed_sents()[-10:], "my_transition_parser.model")
+    start: float = time.perf_counter()
+    my_transition_parser.train(treebank[:100], "my_transition_parser.model")
+    training_times["svm"] = time.perf_counter() - start
+    parses = my_transition_parser.parse(treebank[-10:], "my_transition_parser.model")
+    classifier_parses["svm"] = parses
     print(len(parses))
-    dependency_evaluator = DependencyEvaluator(parses, dependency_treebank.parsed_sents()[-10:])
+    dependency_evaluator = DependencyEvaluator(parses, treebank[-10:])
     print(f"The scores of MyTransitionParser are: {dependency_evaluator.eval()}")
     print()
 
     # Replace SVM classifier with an alternative of your choice
     class MyGBCTransitionParser(MyTransitionParser):
 
-        def train(self, depgraphs, modelfile, verbose=True):
-            try:
-                input_file = tempfile.NamedTemporaryFile(
-                    prefix="transition_parse.train", dir=tempfile.gettempdir(), delete=False
-                )
-
-                if self._algorithm == self.ARC_STANDARD:
-                    self._create_training_examples_arc_std(depgraphs, input_file)
-                else:
-                    self._create_training_examples_arc_eager(depgraphs, input_file)
-
-                input_file.close()
-                # Using the temporary file to train the libsvm classifier
-                x_train, y_train = load_svmlight_file(input_file.name)
-                model = GradientBoostingClassifier(
-                    loss="deviance",
-                    learning_rate=0.1,
-                    verbose=verbose
-                )
-                model.fit(x_train, y_train)
-                # Save the model to file name (as pickle)
-                pickle.dump(model, open(modelfile, "wb"))
-            finally:
-                remove(input_file.name)
+        def __init__(self, algorithm):
+            super().__init__(algorithm, classifier="gbc")
 
     my_gbc_transition_parser = MyGBCTransitionParser("arc-standard")
-    my_gbc_transition_parser.train(dependency_treebank.parsed_sents()[:100], "my_gbc_transition_parser.model")
-    parses = my_gbc_transition_parser.parse(dependency_treebank.parsed_sents()[-10:], "my_gbc_transition_parser.model")
+    start = time.perf_counter()
+    my_gbc_transition_parser.train(treebank[:100], "my_gbc_transition_parser.model")
+    training_times["gbc"] = time.perf_counter() - start
+    parses = my_gbc_transition_parser.parse(treebank[-10:], "my_gbc_transition_parser.model")
+    classifier_parses["gbc"] = parses
     print(len(parses))
-    dependency_evaluator = DependencyEvaluator(parses, dependency_treebank.parsed_sents()[-10:])
+    dependency_evaluator = DependencyEvaluator(parses, treebank[-10:])
     print(f"The scores of MyGBCTransitionParser are: {dependency_evaluator.eval()}")
     print()
+
+    # Compare the training time and the scores of the classifiers on the same sentences
+    for classifier in TRANSITION_CLASSIFIERS:
+        if classifier not in classifier_parses:  # only the classifiers not already trained above
+            classifier_transition_parser = MyTransitionParser("arc-standard", classifier=classifier)
+            start = time.perf_counter()
+            classifier_transition_parser.train(treebank[:100], f"my_{classifier}_transition_parser.model", verbose=False)
+            training_times[classifier] = time.perf_counter() - start
+            classifier_parses[classifier] = classifier_transition_parser.parse(treebank[-10:], f"my_{classifier}_transition_parser.model")
+        parses = classifier_parses[classifier]
+        training_time: float = training_times[classifier]
+        with span("evaluation", sentences=len(parses)):
+            scores: Dict[str, object] = evaluate_treebank(parses, treebank[-10:])  # the scores without punctuation are the ones of DependencyEvaluator
+        print(f"MyTransitionParser with `{classifier}` classifier: trained in {training_time:.1f} s, LAS: {scores['las_without_punctuation']:.3f}, UAS: {scores['uas_without_punctuation']:.3f}")
+    print()
+
+    # the summary of the stages and the trace file are written only if the TRACE_FILE environment variable is set
+    write_trace()
@@ -0,0 +1,158 @@
+from __future__ import absolute_import, annotations
+
+from typing import List, Dict, Tuple, Iterator
+
+import numpy as np
+from scipy import sparse
+
+
+def iterate_svmlight_file(path: str) -> Iterator[Tuple[int, List[int]]]:
+    """
+    read the training examples written by `TransitionParser` one at a time, without loading the whole file
+    :param path: file in libsvm format with binary features (e.g. `3 12:1.0 40:1.0`)
+    :return: generator of (transition, feature indices) pairs
+    """
+    with open(path, encoding="utf-8") as input_file:
+        for line in input_file:
+            fields: List[str] = line.split()
+            if fields:
+                yield int(fields[0]), [int(field.split(":", 1)[0]) for field in fields[1:]]
+
+
+class AveragedPerceptron:
+    """
+    Multi-class averaged perceptron over binary features, trained online with sparse weight tables
+    """
+
+    def __init__(self, epochs: int = 10, verbose: bool = False) -> None:
+        self.epochs = epochs
+        self.verbose = verbose
+        self.classes_: np.ndarray = np.array([], dtype=np.int64)
+        # a row of the tables is allocated only for a feature that takes part in an update, a column for each transition
+        self._rows: Dict[int, int] = {}
+        self._columns: Dict[int, int] = {}
+        self._weights: np.ndarray = np.zeros((1024, 8))
+        # the sums of the weights over time are accumulated lazily, only when a weight changes
+        self._totals: np.ndarray = np.zeros((1024, 8))
+        self._timestamps: np.ndarray = np.zeros((1024, 8), dtype=np.int64)
+        self._instances: int = 0
+        # after the averaging, sorted feature indices and their rows, for looking up the features of many configurations at once
+        self._features: np.ndarray = np.array([], dtype=np.int64)
+        self._feature_rows: np.ndarray = np.array([], dtype=np.int64)
+
+    def _grow(self, rows: int, columns: int) -> None:
+        if rows <= self._weights.shape[0] and columns <= self._weights.shape[1]:
+            return
+
+        shape: Tuple[int, int] = (max(rows, 2 * self._weights.shape[0]) if rows > self._weights.shape[0] else self._weights.shape[0],
+                                  max(columns, 2 * self._weights.shape[1]) if columns > self._weights.shape[1] else self._weights.shape[1])
+        for name in ("_weights", "_totals", "_timestamps"):
+            table: np.ndarray = getattr(self, name)
+            grown: np.ndarray = np.zeros(shape, dtype=table.dtype)
+            grown[:table.shape[0], :table.shape[1]] = table
+            setattr(self, name, grown)
+
+    def _column(self, label: int) -> int:
+        if label not in self._columns:
+            self._columns[label] = len(self._columns)
+            self._grow(len(self._rows), len(self._columns))
+        return self._columns[label]
+
+    def _feature_rows_of(self, features: List[int], allocate: bool = False) -> np.ndarray:
+        if allocate:
+            for feature in features:
+                if feature not in self._rows:
+                    self._rows[feature] = len(self._rows)
+            self._grow(len(self._rows), len(self._columns))
+        return np.fromiter((self._rows[feature] for feature in features if feature in self._rows), dtype=np.int64)
+
+    def _update(self, rows: np.ndarray, column: int, value: float) -> None:
+        self._totals[rows, column] += (self._instances - self._timestamps[rows, column]) * self._weights[rows, column]
+        self._timestamps[rows, column] = self._instances
+        np.add.at(self._weights, (rows, column), value)
+
+    def partial_fit(self, features: List[int], label: int) -> bool:
+        """
+        learn from a single transition, updating only the weights of its features
+        :param features: indices of the active features
+        :param label: the correct transition
+        :return: if the transition was predicted correctly before the update
+        """
+        self._instances += 1
+        column: int = self._column(label)
+        scores: np.ndarray = self._weights[self._feature_rows_of(features), :len(self._columns)].sum(axis=0)
+        guess: int = int(scores.argmax())  # ties are broken deterministically by the order in which the transitions were seen
+        if guess == column:
+            return True
+
+        rows: np.ndarray = self._feature_rows_of(features, allocate=True)
+        self._update(rows, column, 1.0)
+        self._update(rows, guess, -1.0)
+        return False
+
+    def average(self) -> None:
+        # replace every weight with its average over all the seen instances, this makes the model robust to the last updates
+        rows: int = len(self._rows)
+        labels: np.ndarray = np.array(list(self._columns), dtype=np.int64)
+        order: np.ndarray = np.argsort(labels)  # the columns follow the sorted classes, as in scikit-learn
+        totals: np.ndarray = self._totals[:rows, :len(labels)] + (self._instances - self._timestamps[:rows, :len(labels)]) * self._weights[:rows, :len(labels)]
+        self._weights = (totals / max(self._instances, 1))[:, order]
+        self._totals = np.zeros((0, 0))
+        self._timestamps = np.zeros((0, 0), dtype=np.int64)
+        self._columns = {label: column for column, label in enumerate(labels[order].tolist())}
+        self.classes_ = labels[order]
+
+        features: np.ndarray = np.array(list(self._rows), dtype=np.int64)
+        feature_order: np.ndarray = np.argsort(features)
+        self._features = features[feature_order]
+        self._feature_rows = np.array(list(self._rows.values()), dtype=np.int64)[feature_order]
+
+    def fit_file(self, path: str) -> AveragedPerceptron:
+        """
+        train for some epochs streaming the transitions from the file written by `TransitionParser`
+        :param path: file in libsvm format with the training examples
+        :return: the trained perceptron
+        """
+        for epoch in range(self.epochs):
+            correct: int = 0
+            instances: int = 0
+            for label, features in iterate_svmlight_file(path):
+                correct += self.partial_fit(features, label)
+                instances += 1
+            if self.verbose:
+                print(f"epoch {epoch + 1}/{self.epochs}: training accuracy {correct / max(instances, 1):.4f}")
+        self.average()
+        return self
+
+    def fit(self, x_train: sparse.csr_matrix, y_train: np.ndarray) -> AveragedPerceptron:
+        # same interface of the scikit-learn classifiers, for data already loaded in a sparse matrix
+        x_train = sparse.csr_matrix(x_train)
+        for epoch in range(self.epochs):
+            for row in range(x_train.shape[0]):
+                self.partial_fit(x_train.indices[x_train.indptr[row]:x_train.indptr[row + 1]].tolist(), int(y_train[row]))
+        self.average()
+        return self
+
+    def decision_function(self, x: sparse.csr_matrix) -> np.ndarray:
+        # the columns of the features without weights are dropped, the others are mapped to the rows of the averaged table
+        x = sparse.csr_matrix(x)
+        positions: np.ndarray = np.minimum(np.searchsorted(self._features, x.indices), max(len(self._features) - 1, 0))
+        found: np.ndarray = self._features[positions] == x.indices if len(self._features) > 0 else np.zeros(len(x.indices), dtype=bool)
+        rows: np.ndarray = np.repeat(np.arange(x.shape[0]), np.diff(x.indptr))
+        projection: sparse.csr_matrix = sparse.csr_matrix(
+            (x.data[found], (rows[found], self._feature_rows[positions[found]])), shape=(x.shape[0], self._weights.shape[0])
+        )
+        return np.asarray(projection @ self._weights)
+
+    def predict_proba(self, x: sparse.csr_matrix) -> np.ndarray:
+        """
+        softmax of the scores of the transitions, so that they can be ranked as with the probabilities of the SVM
+        :param x: binary features, one row for each configuration
+        :return: matrix with a column for each class in `classes_`
+        """
+        scores: np.ndarray = self.decision_function(x)
+        scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+        return scores / scores.sum(axis=1, keepdims=True)
+
+    def predict(self, x: sparse.csr_matrix) -> np.ndarray:
+        return self.classes_[self.decision_function(x).argmax(axis=1)]
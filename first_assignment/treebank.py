@@ -0,0 +1,143 @@
+from __future__ import absolute_import, annotations
+
+import json
+import os
+from collections import defaultdict
+from collections.abc import Sequence
+from typing import List, Dict, Union, Iterable
+
+import nltk
+from nltk.parse import DependencyGraph
+import numpy as np
+
+
+# files of the arrays in the cache directory, the vocabularies are saved in a JSON file
+ARRAY_NAMES: List[str] = ["words", "tags", "heads", "relations", "offsets"]
+VOCABULARIES_FILE: str = "vocabularies.json"
+
+
+def _encode(values: Iterable[str], vocabulary: Dict[str, int]) -> np.ndarray:
+    return np.fromiter((vocabulary.setdefault(value, len(vocabulary)) for value in values), dtype=np.int32)
+
+
+class Treebank(Sequence):
+    """
+    Dependency treebank encoded as concatenated arrays of ids, its sentences are returned as `DependencyGraph` built on access
+    """
+
+    def __init__(self, words: np.ndarray, tags: np.ndarray, heads: np.ndarray, relations: np.ndarray, offsets: np.ndarray,
+                 word_vocabulary: List[str], tag_vocabulary: List[str], relation_vocabulary: List[str]) -> None:
+        if not len(words) == len(tags) == len(heads) == len(relations):
+            raise ValueError(f"Size Mismatch: words: {len(words)} & tags: {len(tags)} & heads: {len(heads)} & relations: {len(relations)}")
+
+        self.words = words
+        self.tags = tags
+        self.heads = heads
+        self.relations = relations
+        self.offsets = offsets  # the tokens of the i-th sentence are in [offsets[i], offsets[i + 1])
+        self.word_vocabulary = word_vocabulary
+        self.tag_vocabulary = tag_vocabulary
+        self.relation_vocabulary = relation_vocabulary
+        # a slice of the treebank shares the token arrays and selects only the bounds of its sentences
+        self.starts: np.ndarray = offsets[:-1]
+        self.ends: np.ndarray = offsets[1:]
+
+    @classmethod
+    def from_graphs(cls, depgraphs: Iterable[DependencyGraph]) -> Treebank:
+        """
+        encode the sentences of a treebank into arrays
+        :param depgraphs: sentences of the treebank (e.g. `dependency_treebank.parsed_sents()`)
+        :return: the encoded treebank
+        """
+        vocabularies: List[Dict[str, int]] = [{}, {}, {}]
+        words: List[np.ndarray] = []
+        tags: List[np.ndarray] = []
+        heads: List[np.ndarray] = []
+        relations: List[np.ndarray] = []
+        offsets: List[int] = [0]
+        for depgraph in depgraphs:
+            nodes: List[dict] = [depgraph.nodes[address] for address in sorted(depgraph.nodes) if address != 0]
+            words.append(_encode((node["word"] for node in nodes), vocabularies[0]))
+            tags.append(_encode((node["tag"] for node in nodes), vocabularies[1]))
+            heads.append(np.fromiter((node["head"] for node in nodes), dtype=np.int32))
+            relations.append(_encode((node["rel"] for node in nodes), vocabularies[2]))
+            offsets.append(offsets[-1] + len(nodes))
+
+        return cls(*(np.concatenate(arrays) if arrays else np.array([], dtype=np.int32) for arrays in (words, tags, heads, relations)),
+                   np.array(offsets, dtype=np.int64), *(list(vocabulary) for vocabulary in vocabularies))
+
+    @classmethod
+    def load(cls, directory: str) -> Treebank:
+        with open(os.path.join(directory, VOCABULARIES_FILE), encoding="utf-8") as vocabularies_file:
+            vocabularies: Dict[str, List[str]] = json.load(vocabularies_file)
+        # plain array views of the memory-mapped files, slicing a `np.memmap` is slower
+        return cls(*(np.asarray(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")) for name in ARRAY_NAMES),
+                   vocabularies["words"], vocabularies["tags"], vocabularies["relations"])
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, VOCABULARIES_FILE), "w", encoding="utf-8") as vocabularies_file:
+            json.dump({"words": self.word_vocabulary, "tags": self.tag_vocabulary, "relations": self.relation_vocabulary}, vocabularies_file, ensure_ascii=False)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, index: Union[int, slice, List[int], np.ndarray]) -> Union[DependencyGraph, Treebank]:
+        if isinstance(index, (int, np.integer)):
+            return self._depgraph(int(self.starts[index]), int(self.ends[index]))
+
+        # slices and lists of sentence indices (e.g. a random split) select the bounds without copying the tokens
+        view: Treebank = Treebank.__new__(Treebank)
+        view.__dict__.update(self.__dict__)
+        view.starts = self.starts[index]
+        view.ends = self.ends[index]
+        return view
+
+    def parsed_sents(self) -> Treebank:
+        # same interface of the NLTK corpus reader
+        return self
+
+    def sentence_lengths(self) -> np.ndarray:
+        return np.asarray(self.ends - self.starts)
+
+    def token_positions(self) -> np.ndarray:
+        # positions in the token arrays of the tokens of the selected sentences, concatenated in order
+        lengths: np.ndarray = self.sentence_lengths()
+        return np.repeat(np.asarray(self.starts) - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+
+    def _depgraph(self, start: int, end: int) -> DependencyGraph:
+        # same nodes of a graph parsed by NLTK from the Malt-TAB format (word, tag, head, relation)
+        depgraph: DependencyGraph = DependencyGraph()
+        words: List[int] = self.words[start:end].tolist()
+        tags: List[int] = self.tags[start:end].tolist()
+        heads: List[int] = self.heads[start:end].tolist()
+        relations: List[int] = self.relations[start:end].tolist()
+        # all the nodes are created before adding the dependencies, so that a head after its dependent is not created empty
+        for address, (word_id, tag_id, head, relation_id) in enumerate(zip(words, tags, heads, relations), start=1):
+            word: str = self.word_vocabulary[word_id]
+            tag: str = self.tag_vocabulary[tag_id]
+            depgraph.nodes[address] = {"address": address, "word": word, "lemma": word, "ctag": tag, "tag": tag, "feats": "", "head": head, "deps": defaultdict(list), "rel": self.relation_vocabulary[relation_id]}
+        for address, head in enumerate(heads, start=1):
+            relation: str = depgraph.nodes[address]["rel"]
+            depgraph.nodes[head]["deps"][relation if relation or head != 0 else "ROOT"].append(address)
+
+        if depgraph.nodes[0]["deps"]["ROOT"]:
+            depgraph.root = depgraph.nodes[depgraph.nodes[0]["deps"]["ROOT"][0]]
+            depgraph.top_relation_label = "ROOT"
+        return depgraph
+
+
+def load_treebank(directory: str = "cache/dependency_treebank") -> Treebank:
+    """
+    load the NLTK dependency treebank, converting it once into arrays stored in the directory
+    :param directory: directory of the cached arrays
+    :return: the memory-mapped treebank
+    """
+    if not os.path.isfile(os.path.join(directory, VOCABULARIES_FILE)):
+        nltk.download("dependency_treebank")
+        from nltk.corpus import dependency_treebank  # the corpus files are parsed only for the first conversion
+
+        Treebank.from_graphs(dependency_treebank.parsed_sents()).save(directory)
+    return Treebank.load(directory)
@@ -201,6 +201,34 @@ def read_corpus_conll(corpus_file, fs="\t"):
     return sents
 
 
+def iterate_corpus_conll(lines, fs="\t"):
+    """
+    iterate over the sentences of a corpus in CoNLL format, reading one line at a time
+    :param lines: iterable over the lines of the corpus (e.g. an open file)
+    :param fs: field separator
+    :return: generator of sentences
+    """
+    featn = None        # number of features for consistency check
+    words = []          # list to hold feature tuples
+
+    for line in lines:
+        line = line.strip()
+        if len(line) > 0:
+            feats = tuple(line.split(fs))
+            if not featn:
+                featn = len(feats)
+            elif featn != len(feats):
+                raise ValueError("Unexpected number of columns {} ({})".format(len(feats), featn))
+
+            words.append(feats)
+        elif len(words) > 0:
+            yield words
+            words = []
+
+    if len(words) > 0:
+        yield words
+
+
 def get_chunks(corpus_file, fs="\t", otag="O"):
     sents = read_corpus_conll(corpus_file, fs=fs)
     return set([parse_iob(token[-1])[1] for sent in sents for token in sent if token[-1] != otag])
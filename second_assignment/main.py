@@ -1,5 +1,7 @@
 from __future__ import absolute_import, annotations
 
+import os
+import sys
 from typing import List, Union, Tuple, Dict
 
 import pandas as pd
@@ -9,6 +11,9 @@ from spacy import Language
 from spacy.tokens import Doc, Span, Token
 
 from conll import get_chunks, read_corpus_conll, evaluate
+# the tracing library is shared by all the projects, it is in the root of the repository
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tracing import span, write_trace
 
 
 spacy_nlp: Language = spacy.load("en_core_web_sm")
@@ -17,10 +22,6 @@ spacy_nlp: Language = spacy.load("en_core_web_sm")
 # 1. Evaluate spaCy NER on CoNLL 2003 dataset (provided)
 
 # spaCy NER labels are different from the one of the CoNLL 2003 dataset, I had to convert some of them and ignore others
-print(f"spaCy NER labels: {set(spacy_nlp.get_pipe('ner').labels)}")
-print(f"CoNLL 2003 labels: {get_chunks('data/conll2003/test.txt', fs=' ', otag='O')}")
-print()
-
 spacy_ner_label_to_conll: Dict[str, str] = {
     "CARDINAL": "",
     "DATE": "",
@@ -108,7 +109,7 @@ def group_named_entities(doc: Union[str, Doc], use_conll_labels: bool = False) -
 # 3. Fix segmentation errors
 
 # function that extends the entity span to cover the full noun-compounds
-def extend_entity_span(doc: Union[str, Doc], use_head_compound: bool = False, use_children_compound: bool = False, use_conll_labels: bool = False) -> List[Tuple[str, str]]:
+def extend_entity_span(doc: Union[str, Doc], use_head_compound: bool = False, use_children_compound: bool = False, use_conll_labels: bool = False, label_mapping: Dict[str, str] = spacy_ner_label_to_conll) -> List[Tuple[str, str]]:
     if isinstance(doc, str):
         doc: Doc = spacy_nlp(doc)  # since `ents` are a property of `Doc` object and with it we have access to all sentence's tokens
     elif not isinstance(doc, Doc):
@@ -123,6 +124,9 @@ def extend_entity_span(doc: Union[str, Doc], use_head_compound: bool = False, us
     if not isinstance(use_conll_labels, bool):
         raise TypeError("You pass a `use_conll_labels` parameter of a wrong type")
 
+    if not isinstance(label_mapping, dict):
+        raise TypeError("You pass a `label_mapping` parameter of a wrong type")
+
     entities: Dict[int, Tuple[str, str]] = {}
     for ent in doc.ents:
         entity: Dict[int, str] = {}
@@ -141,16 +145,17 @@ def extend_entity_span(doc: Union[str, Doc], use_head_compound: bool = False, us
 
         keys: List[int] = list(entity.keys())
         keys.sort()
+        conll_label: str = label_mapping.get(ent.label_, "")  # the labels mapped to an empty string (or not mapped) are ignored
         if use_conll_labels:
-            if spacy_ner_label_to_conll[ent.label_]:
-                entities[keys.pop(0)] = (entity[keys[0]], f"B-{spacy_ner_label_to_conll[ent.label_]}")
+            if conll_label:
+                entities[keys.pop(0)] = (entity[keys[0]], f"B-{conll_label}")
         else:
             entities[keys.pop(0)] = (entity[keys[0]], f"B-{ent.label_}")
 
         for key in keys:
             if use_conll_labels:
-                if spacy_ner_label_to_conll[ent.label_]:
-                    entities[key] = (entity[key], f"I-{spacy_ner_label_to_conll[ent.label_]}")
+                if conll_label:
+                    entities[key] = (entity[key], f"I-{conll_label}")
             else:
                 entities[key] = (entity[key], f"I-{ent.label_}")
 
@@ -175,44 +180,55 @@ def check_children(token_to_check: Token, entity: Dict[int, str], ent_label: str
 
 if __name__ == "__main__":
 
-    test_sentences = read_corpus_conll("data/conll2003/test.txt", fs=" ")
+    # the labels are printed only when running the script, so that the functions can be imported (e.g. by `tagger.py`) without output
+    print(f"spaCy NER labels: {set(spacy_nlp.get_pipe('ner').labels)}")
+    print(f"CoNLL 2003 labels: {get_chunks('data/conll2003/test.txt', fs=' ', otag='O')}")
+    print()
+
+    with span("corpus reading"):
+        test_sentences = read_corpus_conll("data/conll2003/test.txt", fs=" ")
     refs: List[List[Tuple[str, str]]] = [[(text, iob) for text, pos, chunk, iob in sent] for sent in test_sentences]
 
     spacy_hyps: List[Doc] = []
-    for ref in refs:
-        sentence: str = ""
-        for text, iob in ref:
-            sentence = sentence + text + " "
-        spacy_hyps.append(spacy_nlp(sentence))
+    with span("spaCy parsing", docs=len(refs)) as parsing_span:
+        for ref in refs:
+            sentence: str = ""
+            for text, iob in ref:
+                sentence = sentence + text + " "
+            spacy_hyps.append(spacy_nlp(sentence))
+        parsing_span.count(tokens=sum(len(spacy_hyp) for spacy_hyp in spacy_hyps))
 
     hyps: List[List[Tuple[str, str]]] = []
-    for spacy_hyp in spacy_hyps:
-        hyp: List[Tuple[str, str]] = []
-        unified_token: List[str, str] = []
-        for token in spacy_hyp:
-            if not token.whitespace_:
-                if not unified_token:
-                    unified_token = [token.text, f"{token.ent_iob_}-{spacy_ner_label_to_conll[token.ent_type_]}" if token.ent_type_ and spacy_ner_label_to_conll[token.ent_type_] else "O"]
-                else:
-                    unified_token[0] = unified_token[0] + token.text
-            else:
-                if not unified_token:
-                    hyp.append((token.text, f"{token.ent_iob_}-{spacy_ner_label_to_conll[token.ent_type_]}" if token.ent_type_ and spacy_ner_label_to_conll[token.ent_type_] else "O"))
+    with span("label conversion", docs=len(spacy_hyps)):
+        for spacy_hyp in spacy_hyps:
+            hyp: List[Tuple[str, str]] = []
+            unified_token: List[str, str] = []
+            for token in spacy_hyp:
+                if not token.whitespace_:
+                    if not unified_token:
+                        unified_token = [token.text, f"{token.ent_iob_}-{spacy_ner_label_to_conll[token.ent_type_]}" if token.ent_type_ and spacy_ner_label_to_conll[token.ent_type_] else "O"]
+                    else:
+                        unified_token[0] = unified_token[0] + token.text
                 else:
-                    unified_token[0] = unified_token[0] + token.text
-                    hyp.append(tuple(unified_token))
-                    unified_token: List[str, str] = []
+                    if not unified_token:
+                        hyp.append((token.text, f"{token.ent_iob_}-{spacy_ner_label_to_conll[token.ent_type_]}" if token.ent_type_ and spacy_ner_label_to_conll[token.ent_type_] else "O"))
+                    else:
+                        unified_token[0] = unified_token[0] + token.text
+                        hyp.append(tuple(unified_token))
+                        unified_token: List[str, str] = []
 
-        hyps.append(hyp)
+            hyps.append(hyp)
 
     # token-level performance (per class and total)
-    token_level_performance = classification_report([token[-1] for sent in refs for token in sent], [token[-1] for sent in hyps for token in sent], digits=3)
+    with span("token-level scoring", docs=len(refs)):
+        token_level_performance = classification_report([token[-1] for sent in refs for token in sent], [token[-1] for sent in hyps for token in sent], digits=3)
     print(f"token-level performances:")
     print(token_level_performance)
     print()
 
     # chunk-level performance (per class and total)
-    chunk_level_performances = evaluate(refs, hyps)
+    with span("conlleval scoring", docs=len(refs)):
+        chunk_level_performances = evaluate(refs, hyps)
     print("chunk-level performances:")
     print(pd.DataFrame().from_dict(chunk_level_performances, orient="index").round(decimals=3))
     print()
@@ -226,18 +242,19 @@ if __name__ == "__main__":
     # frequency analysis of the groups in CoNLL 2003: inner lists are groups, I simply count their frequencies
     frequency_analysis: Dict[Tuple[str], int] = {}
     frequency_analysis_conll_labels: Dict[Tuple[str], int] = {}
-    for spacy_hyp in spacy_hyps:
-        for entity_list in group_named_entities(spacy_hyp, use_conll_labels=False):
-            if tuple(entity_list) in frequency_analysis:
-                frequency_analysis[tuple(entity_list)] += 1
-            else:
-                frequency_analysis[tuple(entity_list)] = 1
+    with span("entity grouping", docs=len(spacy_hyps)):
+        for spacy_hyp in spacy_hyps:
+            for entity_list in group_named_entities(spacy_hyp, use_conll_labels=False):
+                if tuple(entity_list) in frequency_analysis:
+                    frequency_analysis[tuple(entity_list)] += 1
+                else:
+                    frequency_analysis[tuple(entity_list)] = 1
 
-        for entity_list in group_named_entities(spacy_hyp, use_conll_labels=True):
-            if tuple(entity_list) in frequency_analysis_conll_labels:
-                frequency_analysis_conll_labels[tuple(entity_list)] += 1
-            else:
-                frequency_analysis_conll_labels[tuple(entity_list)] = 1
+            for entity_list in group_named_entities(spacy_hyp, use_conll_labels=True):
+                if tuple(entity_list) in frequency_analysis_conll_labels:
+                    frequency_analysis_conll_labels[tuple(entity_list)] += 1
+                else:
+                    frequency_analysis_conll_labels[tuple(entity_list)] = 1
 
     print("frequency analysis of the groups in CoNLL 2003:")
     print(frequency_analysis)
@@ -256,85 +273,95 @@ if __name__ == "__main__":
     hyps_head: List[List[Tuple[str, str]]] = []
     hyps_children: List[List[Tuple[str, str]]] = []
     hyps_head_and_children: List[List[Tuple[str, str]]] = []
-    for spacy_hyp in spacy_hyps:
-        extended_entity_span_head = extend_entity_span(spacy_hyp, use_head_compound=True, use_conll_labels=True)
-        extended_entity_span_children = extend_entity_span(spacy_hyp, use_children_compound=True, use_conll_labels=True)
-        extended_entity_span_head_and_children = extend_entity_span(spacy_hyp, use_head_compound=True, use_children_compound=True, use_conll_labels=True)
-        hyp_head: List[Tuple[str, str]] = []
-        hyp_children: List[Tuple[str, str]] = []
-        hyp_head_and_children: List[Tuple[str, str]] = []
-        unified_token_head: List[str, str] = []
-        unified_token_children: List[str, str] = []
-        unified_token_head_and_children: List[str, str] = []
-        for token in spacy_hyp:
-            if not token.whitespace_:
-                if not unified_token_head:
-                    unified_token_head = [token.text, extended_entity_span_head[token.i][1]]
-                else:
-                    unified_token_head[0] = unified_token_head[0] + token.text
+    with span("span post-processing", docs=len(spacy_hyps)):
+        for spacy_hyp in spacy_hyps:
+            extended_entity_span_head = extend_entity_span(spacy_hyp, use_head_compound=True, use_conll_labels=True)
+            extended_entity_span_children = extend_entity_span(spacy_hyp, use_children_compound=True, use_conll_labels=True)
+            extended_entity_span_head_and_children = extend_entity_span(spacy_hyp, use_head_compound=True, use_children_compound=True, use_conll_labels=True)
+            hyp_head: List[Tuple[str, str]] = []
+            hyp_children: List[Tuple[str, str]] = []
+            hyp_head_and_children: List[Tuple[str, str]] = []
+            unified_token_head: List[str, str] = []
+            unified_token_children: List[str, str] = []
+            unified_token_head_and_children: List[str, str] = []
+            for token in spacy_hyp:
+                if not token.whitespace_:
+                    if not unified_token_head:
+                        unified_token_head = [token.text, extended_entity_span_head[token.i][1]]
+                    else:
+                        unified_token_head[0] = unified_token_head[0] + token.text
 
-                if not unified_token_children:
-                    unified_token_children = [token.text, extended_entity_span_children[token.i][1]]
-                else:
-                    unified_token_children[0] = unified_token_children[0] + token.text
+                    if not unified_token_children:
+                        unified_token_children = [token.text, extended_entity_span_children[token.i][1]]
+                    else:
+                        unified_token_children[0] = unified_token_children[0] + token.text
 
-                if not unified_token_head_and_children:
-                    unified_token_head_and_children = [token.text, extended_entity_span_head_and_children[token.i][1]]
-                else:
-                    unified_token_head_and_children[0] = unified_token_head_and_children[0] + token.text
+                    if not unified_token_head_and_children:
+                        unified_token_head_and_children = [token.text, extended_entity_span_head_and_children[token.i][1]]
+                    else:
+                        unified_token_head_and_children[0] = unified_token_head_and_children[0] + token.text
 
-            else:
-                if not unified_token_head:
-                    hyp_head.append((token.text, extended_entity_span_head[token.i][1]))
                 else:
-                    unified_token_head[0] = unified_token_head[0] + token.text
-                    hyp_head.append(tuple(unified_token_head))
-                    unified_token_head: List[str, str] = []
+                    if not unified_token_head:
+                        hyp_head.append((token.text, extended_entity_span_head[token.i][1]))
+                    else:
+                        unified_token_head[0] = unified_token_head[0] + token.text
+                        hyp_head.append(tuple(unified_token_head))
+                        unified_token_head: List[str, str] = []
 
-                if not unified_token_children:
-                    hyp_children.append((token.text, extended_entity_span_children[token.i][1]))
-                else:
-                    unified_token_children[0] = unified_token_children[0] + token.text
-                    hyp_children.append(tuple(unified_token_children))
-                    unified_token_children: List[str, str] = []
+                    if not unified_token_children:
+                        hyp_children.append((token.text, extended_entity_span_children[token.i][1]))
+                    else:
+                        unified_token_children[0] = unified_token_children[0] + token.text
+                        hyp_children.append(tuple(unified_token_children))
+                        unified_token_children: List[str, str] = []
 
-                if not unified_token_head_and_children:
-                    hyp_head_and_children.append((token.text, extended_entity_span_head_and_children[token.i][1]))
-                else:
-                    unified_token_head_and_children[0] = unified_token_head_and_children[0] + token.text
-                    hyp_head_and_children.append(tuple(unified_token_head_and_children))
-                    unified_token_head_and_children: List[str, str] = []
+                    if not unified_token_head_and_children:
+                        hyp_head_and_children.append((token.text, extended_entity_span_head_and_children[token.i][1]))
+                    else:
+                        unified_token_head_and_children[0] = unified_token_head_and_children[0] + token.text
+                        hyp_head_and_children.append(tuple(unified_token_head_and_children))
+                        unified_token_head_and_children: List[str, str] = []
 
-        hyps_head.append(hyp_head)
-        hyps_children.append(hyp_children)
-        hyps_head_and_children.append(hyp_head_and_children)
+            hyps_head.append(hyp_head)
+            hyps_children.append(hyp_children)
+            hyps_head_and_children.append(hyp_head_and_children)
 
-    token_level_performance = classification_report([token[-1] for sent in refs for token in sent], [token[-1] for sent in hyps_head for token in sent], digits=3)
+    with span("token-level scoring", docs=len(refs)):
+        token_level_performance = classification_report([token[-1] for sent in refs for token in sent], [token[-1] for sent in hyps_head for token in sent], digits=3)
     print(f"token-level performances head:")
     print(token_level_performance)
     print()
 
-    chunk_level_performances = evaluate(refs, hyps_head)
+    with span("conlleval scoring", docs=len(refs)):
+        chunk_level_performances = evaluate(refs, hyps_head)
     print("chunk-level performances head:")
     print(pd.DataFrame().from_dict(chunk_level_performances, orient="index").round(decimals=3))
     print()
 
-    token_level_performance = classification_report([token[-1] for sent in refs for token in sent], [token[-1] for sent in hyps_children for token in sent], digits=3)
+    with span("token-level scoring", docs=len(refs)):
+        token_level_performance = classification_report([token[-1] for sent in refs for token in sent], [token[-1] for sent in hyps_children for token in sent], digits=3)
     print(f"token-level performances children:")
     print(token_level_performance)
     print()
 
-    chunk_level_performances = evaluate(refs, hyps_children)
+    with span("conlleval scoring", docs=len(refs)):
+        chunk_level_performances = evaluate(refs, hyps_children)
     print("chunk-level performances children:")
     print(pd.DataFrame().from_dict(chunk_level_performances, orient="index").round(decimals=3))
     print()
 
-    token_level_performance = classification_report([token[-1] for sent in refs for token in sent], [token[-1] for sent in hyps_head_and_children for token in sent], digits=3)
+    with span("token-level scoring", docs=len(refs)):
+        token_level_performance = classification_report([token[-1] for sent in refs for token in sent], [token[-1] for sent in hyps_head_and_children for token in sent], digits=3)
     print(f"token-level performances head + children:")
     print(token_level_performance)
     print()
 
-    chunk_level_performances = evaluate(refs, hyps_head_and_children)
+    with span("conlleval scoring", docs=len(refs)):
+        chunk_level_performances = evaluate(refs, hyps_head_and_children)
     print("chunk-level performances head + children:")
     print(pd.DataFrame().from_dict(chunk_level_performances, orient="index").round(decimals=3))
     print()
+
+    # the summary of the stages and the trace file are written only if the TRACE_FILE environment variable is set
+    write_trace()
@@ -0,0 +1,200 @@
+from __future__ import absolute_import, annotations
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Dict, Iterable, Optional
+
+import pandas as pd
+from spacy.tokens import Doc, DocBin
+
+from conll import read_corpus_conll, evaluate
+from main import extend_entity_span, spacy_nlp, spacy_ner_label_to_conll
+from tagger import align_to_words
+
+
+# a post-processing configuration: `use_head_compound`, `use_children_compound`, the name of the label mapping and the entity types to drop
+Configuration = Dict[str, object]
+# the reference sentences as (word, IOB tag) pairs and the spaCy documents of the same sentences
+Corpus = Tuple[List[List[Tuple[str, str]]], List[Doc]]
+
+# the corpus shared by the processes of the pool: inherited when the processes are forked, loaded once by each process otherwise
+_corpus: Optional[Corpus] = None
+_label_mappings: Dict[str, Dict[str, str]] = {}
+
+
+def hash_json(value: object) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def corpus_hash(corpus_file: str) -> str:
+    # the parses depend also on the spaCy model, so its name and version are part of the hash
+    digest = hashlib.sha256()
+    with open(corpus_file, "rb") as input_file:
+        for block in iter(lambda: input_file.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(f"{spacy_nlp.meta['name']}-{spacy_nlp.meta['version']}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def build_grid(use_head_compound: Iterable[bool] = (False, True), use_children_compound: Iterable[bool] = (False, True), label_mappings: Iterable[str] = ("default",),
+               drop_types: Iterable[Iterable[str]] = ((),)) -> List[Configuration]:
+    """
+    build all the combinations of the post-processing options
+    :param use_head_compound: values of `use_head_compound` to try
+    :param use_children_compound: values of `use_children_compound` to try
+    :param label_mappings: names of the label mapping tables to try
+    :param drop_types: sets of entity types (spaCy or CoNLL ones) to drop
+    :return: the configurations of the grid
+    """
+    return [
+        {"use_head_compound": head, "use_children_compound": children, "label_mapping": mapping, "drop_types": sorted(set(drop))}
+        for head, children, mapping, drop in itertools.product(use_head_compound, use_children_compound, label_mappings, drop_types)
+    ]
+
+
+def configuration_mapping(configuration: Configuration, label_mappings: Dict[str, Dict[str, str]]) -> Dict[str, str]:
+    # the dropped types are mapped to an empty string, that `extend_entity_span` ignores
+    drop_types: List[str] = configuration["drop_types"]
+    return {label: "" if label in drop_types or conll_label in drop_types else conll_label for label, conll_label in label_mappings[configuration["label_mapping"]].items()}
+
+
+def configuration_hash(configuration: Configuration, label_mappings: Dict[str, Dict[str, str]]) -> str:
+    # the hash depends on the content of the mapping table, not on its name
+    return hash_json({"use_head_compound": configuration["use_head_compound"], "use_children_compound": configuration["use_children_compound"],
+                      "label_mapping": configuration_mapping(configuration, label_mappings)})
+
+
+def parse_corpus(corpus_file: str, cache_directory: str, fs: str = " ", batch_size: int = 256) -> Corpus:
+    """
+    parse the sentences of a CoNLL corpus with spaCy, only the first time, storing the documents in a DocBin
+    :param corpus_file: CoNLL file of the corpus
+    :param cache_directory: directory of the cached documents
+    :param fs: field separator of the CoNLL file
+    :param batch_size: number of sentences processed together by spaCy
+    :return: the reference sentences and their spaCy documents
+    """
+    refs: List[List[Tuple[str, str]]] = [[(token[0], token[-1]) for token in sentence] for sentence in read_corpus_conll(corpus_file, fs=fs)]
+    docs_path: str = os.path.join(cache_directory, f"{corpus_hash(corpus_file)}.spacy")
+    if os.path.isfile(docs_path):
+        return refs, list(DocBin().from_disk(docs_path).get_docs(spacy_nlp.vocab))
+
+    # the same text of `main.py`, each word followed by a whitespace
+    docs: List[Doc] = list(spacy_nlp.pipe(("".join(f"{text} " for text, _ in ref) for ref in refs), batch_size=batch_size))
+    os.makedirs(cache_directory, exist_ok=True)
+    DocBin(docs=docs).to_disk(docs_path)
+    return refs, docs
+
+
+def _initialize_worker(corpus_file: str, cache_directory: str, fs: str, label_mappings: Dict[str, Dict[str, str]]) -> None:
+    global _corpus, _label_mappings
+    if _corpus is None:
+        _corpus = parse_corpus(corpus_file, cache_directory, fs=fs)
+    _label_mappings = label_mappings
+
+
+def score_configuration(configuration: Configuration) -> Dict[str, Dict[str, float]]:
+    """
+    evaluate a post-processing configuration on the shared corpus with conlleval
+    :param configuration: configuration to evaluate
+    :return: the chunk-level scores for each class and in total
+    """
+    refs, docs = _corpus
+    label_mapping: Dict[str, str] = configuration_mapping(configuration, _label_mappings)
+    hyps: List[List[Tuple[str, str]]] = []
+    for ref, doc in zip(refs, docs):
+        tags: List[str] = [tag for _, tag in extend_entity_span(doc, use_head_compound=configuration["use_head_compound"], use_children_compound=configuration["use_children_compound"],
+                                                                 use_conll_labels=True, label_mapping=label_mapping)]
+        hyps.append([(text, tag) for (text, _), tag in zip(ref, align_to_words(doc, tags))])
+    return evaluate(refs, hyps)
+
+
+def _write_scores(configurations: Dict[str, Configuration], computed: Iterable[Dict[str, Dict[str, float]]], label_mappings: Dict[str, Dict[str, str]]) -> None:
+    # each result is written as soon as it is ready, so an interrupted sweep keeps the configurations already evaluated
+    for (path, configuration), scores in zip(configurations.items(), computed):
+        with open(path, "w", encoding="utf-8") as scores_file:
+            json.dump({"configuration": configuration, "label_mapping": configuration_mapping(configuration, label_mappings), "scores": scores}, scores_file)
+
+
+def run_sweep(configurations: List[Configuration], corpus_file: str, label_mappings: Dict[str, Dict[str, str]], cache_directory: str = "cache/sweep", fs: str = " ",
+              processes: int = 1) -> List[Tuple[Configuration, Dict[str, Dict[str, float]]]]:
+    """
+    evaluate the configurations of a grid, computing only the ones whose scores are not cached for the corpus
+    :param configurations: configurations to evaluate (e.g. built by `build_grid`)
+    :param corpus_file: CoNLL file of the corpus
+    :param label_mappings: label mapping tables (from spaCy labels to CoNLL ones, or an empty string to ignore them) by name
+    :param cache_directory: directory of the cached documents and scores
+    :param fs: field separator of the CoNLL file
+    :param processes: number of processes evaluating the configurations
+    :return: each configuration with its scores, in the same order
+    """
+    global _corpus, _label_mappings
+    scores_directory: str = os.path.join(cache_directory, corpus_hash(corpus_file))
+    os.makedirs(scores_directory, exist_ok=True)
+    scores_paths: List[str] = [os.path.join(scores_directory, f"{configuration_hash(configuration, label_mappings)}.json") for configuration in configurations]
+
+    # the same configuration may appear more times in the grid (e.g. with mappings that differ only for dropped types), it is computed once
+    missing: Dict[str, Configuration] = {path: configuration for path, configuration in zip(scores_paths, configurations) if not os.path.isfile(path)}
+    if missing:
+        _corpus = parse_corpus(corpus_file, cache_directory, fs=fs)
+        _label_mappings = label_mappings
+        if processes <= 1:
+            _write_scores(missing, map(score_configuration, missing.values()), label_mappings)
+        else:
+            with ProcessPoolExecutor(max_workers=processes, initializer=_initialize_worker, initargs=(corpus_file, cache_directory, fs, label_mappings)) as executor:
+                _write_scores(missing, executor.map(score_configuration, missing.values()), label_mappings)
+
+    results: List[Tuple[Configuration, Dict[str, Dict[str, float]]]] = []
+    for path, configuration in zip(scores_paths, configurations):
+        with open(path, encoding="utf-8") as scores_file:
+            results.append((configuration, json.load(scores_file)["scores"]))
+    return results
+
+
+def results_table(results: List[Tuple[Configuration, Dict[str, Dict[str, float]]]]) -> pd.DataFrame:
+    # one row for each configuration with the total scores, sorted by f1 score
+    rows: List[Dict[str, object]] = [
+        {"head": configuration["use_head_compound"], "children": configuration["use_children_compound"], "mapping": configuration["label_mapping"],
+         "drop": ",".join(configuration["drop_types"]), **{name: value for name, value in scores["total"].items()}}
+        for configuration, scores in results
+    ]
+    return pd.DataFrame(rows).sort_values("f1 score", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluate in parallel a grid of post-processing configurations of `extend_entity_span` on a CoNLL corpus, caching the scores of each configuration")
+    parser.add_argument("corpus", nargs="?", default="data/conll2003/test.txt", help="CoNLL file of the corpus")
+    parser.add_argument("--fs", default=" ", help="field separator of the CoNLL file")
+    parser.add_argument("--mappings", default=None, help="JSON file with the label mapping tables by name (the default mapping of `main.py` is always available as `default`)")
+    parser.add_argument("--drop", action="append", default=None, help="comma separated entity types to drop (spaCy or CoNLL ones), can be repeated, an empty string does not drop any type")
+    parser.add_argument("--head-compound", choices=["yes", "no", "both"], default="both", help="values of `use_head_compound` to try")
+    parser.add_argument("--children-compound", choices=["yes", "no", "both"], default="both", help="values of `use_children_compound` to try")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="number of processes evaluating the configurations")
+    parser.add_argument("--cache", default="cache/sweep", help="directory of the cached documents and scores")
+    arguments = parser.parse_args()
+
+    label_mappings: Dict[str, Dict[str, str]] = {"default": spacy_ner_label_to_conll}
+    if arguments.mappings is not None:
+        with open(arguments.mappings, encoding="utf-8") as mappings_file:
+            label_mappings.update(json.load(mappings_file))
+
+    values: Dict[str, List[bool]] = {"yes": [True], "no": [False], "both": [False, True]}
+    configurations: List[Configuration] = build_grid(
+        values[arguments.head_compound], values[arguments.children_compound], label_mappings.keys(),
+        [[label for label in drop.split(",") if label] for drop in arguments.drop] if arguments.drop else [[]]
+    )
+
+    start: float = time.perf_counter()
+    results = run_sweep(configurations, arguments.corpus, label_mappings, cache_directory=arguments.cache, fs=arguments.fs, processes=arguments.processes)
+    with pd.option_context("display.max_rows", None, "display.width", None):
+        print(results_table(results).round(decimals=3))
+    print(f"evaluated {len(configurations)} configurations in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+from __future__ import absolute_import, annotations
+
+import argparse
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from typing import List, Tuple, Dict, Iterable, Iterator, Optional, Deque, TextIO
+
+from spacy.tokens import Doc
+
+from conll import iterate_corpus_conll
+from main import extend_entity_span, group_named_entities, spacy_nlp
+
+
+# a document to tag: its position in the input, its text and, for the CoNLL input, its original tokens
+Document = Tuple[int, str, Optional[List[str]]]
+
+
+def read_documents(lines: Iterable[str], input_format: str = "text", fs: str = " ") -> Iterator[Document]:
+    """
+    read the documents to tag one at a time, so that the memory does not depend on the size of the input
+    :param lines: lines of the input (e.g. an open file or stdin)
+    :param input_format: `text` for one raw text for each line or `conll` for one sentence for each block of CoNLL lines
+    :param fs: field separator of the CoNLL input
+    :return: generator of documents
+    """
+    if input_format == "text":
+        for index, line in enumerate(lines):
+            yield index, line.rstrip("\n"), None
+    elif input_format == "conll":
+        index: int = 0
+        for sentence in iterate_corpus_conll(lines, fs=fs):
+            words: List[str] = [token[0] for token in sentence]
+            if words[0] == "-DOCSTART-":  # document separators are not sentences
+                continue
+            yield index, " ".join(words), words
+            index += 1
+    else:
+        raise ValueError(f"Unknown Format: {input_format}")
+
+
+def align_to_words(doc: Doc, tags: List[str]) -> List[str]:
+    # spaCy may split a CoNLL token in more tokens (not followed by a whitespace), the token takes the tag of its first part
+    word_tags: List[str] = []
+    in_word: bool = False
+    for token in doc:
+        if not in_word:
+            word_tags.append(tags[token.i])
+        in_word = not token.whitespace_ and token.i < len(doc) - 1
+    return word_tags
+
+
+def tag_documents(documents: List[Document], use_head_compound: bool = False, use_children_compound: bool = False, use_conll_labels: bool = False, groups: bool = False, batch_size: int = 64) -> str:
+    """
+    tag a chunk of documents with `nlp.pipe` and `extend_entity_span`
+    :param documents: documents to tag
+    :param use_head_compound: extend the entities to the head of their `compound` relations
+    :param use_children_compound: extend the entities to the children in `compound` relation
+    :param use_conll_labels: use the CoNLL 2003 labels instead of the spaCy ones
+    :param groups: add the entity groups computed by `group_named_entities`
+    :param batch_size: number of documents processed together by spaCy
+    :return: the JSON lines of the documents
+    """
+    lines: List[str] = []
+    for (index, text, words), doc in zip(documents, spacy_nlp.pipe((text for _, text, _ in documents), batch_size=batch_size)):
+        tags: List[str] = [tag for _, tag in extend_entity_span(doc, use_head_compound=use_head_compound, use_children_compound=use_children_compound, use_conll_labels=use_conll_labels)]
+        record: Dict[str, object] = {"id": index}
+        if words is None:
+            record.update({"text": text, "tokens": [token.text for token in doc], "tags": tags})
+        else:
+            record.update({"tokens": words, "tags": align_to_words(doc, tags)})
+        if groups:
+            record["groups"] = group_named_entities(doc, use_conll_labels=use_conll_labels)
+        lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+    return "".join(lines)
+
+
+def _chunks(documents: Iterator[Document], chunk_size: int) -> Iterator[List[Document]]:
+    chunk: List[Document] = []
+    for document in documents:
+        chunk.append(document)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def tag_stream(documents: Iterator[Document], output: TextIO, processes: int = 1, chunk_size: int = 256, **options) -> int:
+    """
+    tag the documents in chunks, with a pool of processes if more than one, writing the JSON lines in the input order
+    :param documents: documents to tag
+    :param output: where the JSON lines are written
+    :param processes: number of processes tagging the chunks
+    :param chunk_size: number of documents sent together to a process
+    :param options: options of `tag_documents`
+    :return: number of tagged documents
+    """
+    tag_chunk = partial(tag_documents, **options)
+    tagged: int = 0
+    if processes <= 1:
+        for chunk in _chunks(documents, chunk_size):
+            output.write(tag_chunk(chunk))
+            tagged += len(chunk)
+        return tagged
+
+    # at most two chunks for each process are pending, so the input is read only as fast as it is tagged
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending: Deque[Tuple[Future, int]] = deque()
+        for chunk in _chunks(documents, chunk_size):
+            if len(pending) >= 2 * processes:
+                future, size = pending.popleft()
+                output.write(future.result())
+                tagged += size
+            pending.append((executor.submit(tag_chunk, chunk), len(chunk)))
+        while pending:
+            future, size = pending.popleft()
+            output.write(future.result())
+            tagged += size
+    return tagged
+
+
+def _input_lines(paths: List[str]) -> Iterator[str]:
+    for path in paths or ["-"]:
+        if path == "-":
+            yield from sys.stdin
+        else:
+            with open(path, encoding="utf-8") as input_file:
+                yield from input_file
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tag raw texts or CoNLL sentences with spaCy NER extended by `extend_entity_span`, writing one JSON line for each document")
+    parser.add_argument("inputs", nargs="*", help="input files (stdin if none or `-`)")
+    parser.add_argument("--format", choices=["text", "conll"], default="text", help="one raw text for each line or CoNLL sentences separated by empty lines")
+    parser.add_argument("--fs", default=" ", help="field separator of the CoNLL input")
+    parser.add_argument("--output", default=None, help="output file (stdout if not given)")
+    parser.add_argument("--head-compound", action="store_true", help="extend the entities to the head of their `compound` relations")
+    parser.add_argument("--children-compound", action="store_true", help="extend the entities to the children in `compound` relation")
+    parser.add_argument("--conll-labels", action="store_true", help="use the CoNLL 2003 labels (PER, LOC, ORG, MISC) instead of the spaCy ones")
+    parser.add_argument("--groups", action="store_true", help="add the entity groups computed by `group_named_entities`")
+    parser.add_argument("--processes", type=int, default=1, help="number of processes tagging the documents")
+    parser.add_argument("--chunk-size", type=int, default=256, help="number of documents sent together to a process")
+    parser.add_argument("--batch-size", type=int, default=64, help="number of documents processed together by spaCy")
+    arguments = parser.parse_args()
+
+    start: float = time.perf_counter()
+    # the writes are buffered, the output is flushed in large blocks
+    with open(arguments.output if arguments.output is not None else sys.stdout.fileno(), "w", encoding="utf-8", buffering=1 << 20, closefd=arguments.output is not None) as output:
+        tagged: int = tag_stream(
+            read_documents(_input_lines(arguments.inputs), arguments.format, arguments.fs), output, processes=arguments.processes, chunk_size=arguments.chunk_size,
+            use_head_compound=arguments.head_compound, use_children_compound=arguments.children_compound, use_conll_labels=arguments.conll_labels, groups=arguments.groups, batch_size=arguments.batch_size
+        )
+    elapsed: float = time.perf_counter() - start
+    print(f"tagged {tagged} documents in {elapsed:.1f} s ({tagged / elapsed if elapsed > 0 else 0.0:.1f} docs/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
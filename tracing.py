@@ -0,0 +1,135 @@
+from __future__ import absolute_import, annotations
+
+import json
+import os
+import threading
+import time
+from typing import List, Dict, Optional
+
+
+class _DisabledSpan:
+    # shared by all the spans of a disabled tracer, so that a traced stage costs only a method call
+
+    def __enter__(self) -> _DisabledSpan:
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        return False
+
+    def count(self, **counters: int) -> None:
+        pass
+
+
+_DISABLED_SPAN: _DisabledSpan = _DisabledSpan()
+
+
+class Span:
+    """
+    Timed span of a stage, with the counters (e.g. docs, tokens, batches) of the work done inside it
+    """
+
+    def __init__(self, tracer: Tracer, name: str, counters: Dict[str, int]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.counters = counters
+        self.start: int = 0
+
+    def __enter__(self) -> Span:
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        self.tracer.record(self.name, self.start, time.perf_counter_ns(), self.counters)
+        return False
+
+    def count(self, **counters: int) -> None:
+        for name, value in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+class Tracer:
+    """
+    Collector of the timed spans of the stages of a pipeline, it does nothing while it is disabled
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.events: List[dict] = []
+        self._origin: int = time.perf_counter_ns()
+
+    def span(self, name: str, **counters: int) -> Span:
+        """
+        time a stage with `with tracer.span("spaCy parsing", docs=len(texts)) as span:`, more counters can be added with `span.count`
+        :param name: name of the stage, the spans with the same name are aggregated in the summary
+        :param counters: initial counters of the span
+        :return: the span (a shared no-op one if the tracer is disabled)
+        """
+        if not self.enabled:
+            return _DISABLED_SPAN
+        return Span(self, name, dict(counters))
+
+    def record(self, name: str, start: int, end: int, counters: Dict[str, int]) -> None:
+        # appending to a list is atomic, the spans can be recorded by many threads
+        self.events.append({"name": name, "start": start, "end": end, "thread": threading.get_ident(), "counters": counters})
+
+    def stages(self) -> Dict[str, Dict[str, object]]:
+        """
+        aggregate the spans by name, in order of first appearance
+        :return: for each stage the number of calls, the total seconds and the sums of the counters
+        """
+        stages: Dict[str, Dict[str, object]] = {}
+        for event in self.events:
+            stage: Dict[str, object] = stages.setdefault(event["name"], {"calls": 0, "seconds": 0.0, "counters": {}})
+            stage["calls"] += 1
+            stage["seconds"] += (event["end"] - event["start"]) / 1e9
+            for name, value in event["counters"].items():
+                stage["counters"][name] = stage["counters"].get(name, 0) + value
+        return stages
+
+    def summary(self) -> str:
+        # the share is computed on the time from the start of the first span to the end of the last one, nested spans are counted in both
+        if not self.events:
+            return "no traced stages"
+
+        wall: float = (max(event["end"] for event in self.events) - min(event["start"] for event in self.events)) / 1e9
+        lines: List[str] = [f"{'stage':<32}{'calls':>8}{'total s':>12}{'mean ms':>12}{'share':>8}  counters"]
+        for name, stage in self.stages().items():
+            counters: str = ", ".join(f"{counter}: {value} ({value / stage['seconds'] if stage['seconds'] > 0 else 0.0:.1f}/s)" for counter, value in stage["counters"].items())
+            lines.append(f"{name:<32}{stage['calls']:>8}{stage['seconds']:>12.3f}{stage['seconds'] * 1e3 / stage['calls']:>12.2f}{stage['seconds'] / wall if wall > 0 else 0.0:>8.1%}  {counters}")
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> Dict[str, object]:
+        # complete events of the Chrome trace format (timestamps in microseconds), viewable in chrome://tracing or Perfetto
+        pid: int = os.getpid()
+        return {
+            "traceEvents": [
+                {"name": event["name"], "cat": "stage", "ph": "X", "ts": (event["start"] - self._origin) / 1e3, "dur": (event["end"] - event["start"]) / 1e3, "pid": pid, "tid": event["thread"], "args": event["counters"]}
+                for event in self.events
+            ],
+            "displayTimeUnit": "ms",
+            "otherData": {"stages": self.stages()},
+        }
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as trace_file:
+            json.dump(self.chrome_trace(), trace_file)
+
+    def reset(self) -> None:
+        self.events = []
+        self._origin = time.perf_counter_ns()
+
+
+# the tracer of the scripts, enabled by setting the TRACE_FILE environment variable to the path of the trace to write
+TRACE_FILE: Optional[str] = os.environ.get("TRACE_FILE")
+tracer: Tracer = Tracer(enabled=TRACE_FILE is not None)
+span = tracer.span
+
+
+def write_trace(path: Optional[str] = TRACE_FILE) -> None:
+    """
+    write the Chrome trace of the stages and print their summary table, only if the tracer is enabled
+    :param path: path of the JSON trace file
+    """
+    if tracer.enabled and path is not None:
+        tracer.save(path)
+        print(tracer.summary())